@@ -17,6 +17,20 @@ except ImportError:
     micropython = types.SimpleNamespace(native=lambda f: f)
 ################################################################################
 
+from array import array
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    # desktop versions of the MicroPython timers
+    from time import perf_counter_ns
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(end, start):
+        return end - start
+
 
 WALL_ABSENT = 0
 WALL_PRESENT = 1
@@ -26,6 +40,9 @@ WALL_MASK = 3
 
 ALL_UNKNOWN = 0b10101010
 
+# AND a walls byte with WALL_CLEAR[direction] to clear the wall in that direction
+WALL_CLEAR = tuple(0xFF & ~(WALL_MASK << direction * 2) for direction in range(4))
+
 CLOSED_MAZE_MASK = 3
 OPEN_MAZE_MASK = 1
 
@@ -34,6 +51,12 @@ OPEN_MAZE_MASK = 1
 VIEW_PLAIN = 0
 VIEW_COSTS = 1
 VIEW_DIRS = 2
+VIEW_VISITED = 3
+
+# the pieces that the maze string is built from
+POST_TEXT = ("   o", "---o")  # the wall to the North or South of a cell, then a post
+SIDE_TEXT = (" ", "|")  # the wall to the West or East of a cell
+DIR_TEXT = (" ^ ", " > ", " v ", " < ", "   ")  # way to go for VIEW_DIRS, or none
 
 """
  * Directions are absolute and are not relative to any particular heading
@@ -46,16 +69,183 @@ DIR_WEST = 3
 DIR_COUNT = 4
 DIR_BLOCKED = -1
 
+# moves in a compiled route. Any positive number is that many cells forward
+MOVE_LEFT = -1
+MOVE_RIGHT = -2
+MOVE_AROUND = -3
+
+# The standard binary .maz file has one byte per cell in the same order as
+# the cells in the Maze class. Each has a bit set for each wall that is present.
+# These tables convert a .maz byte to a byte of Maze.walls and back again
+MAZ_TO_WALLS = bytes(
+    [sum((WALL_PRESENT if maz >> d & 1 else WALL_ABSENT) << d * 2 for d in range(4))
+     for maz in range(256)])
+WALLS_TO_MAZ = bytes(
+    [sum(1 << d for d in range(4) if walls >> d * 2 & OPEN_MAZE_MASK)
+     for walls in range(256)])
+
+# GRADIENT_CHOICE[heading * 16 + exits] is the direction to take from a cell
+# facing heading when exits has a bit set for each direction leading to a
+# neighbour with the smallest cost. The order is ahead, left, right then back
+GRADIENT_CHOICE = bytes(
+    [next((d for d in (h, (h + 3) % 4, (h + 1) % 4, (h + 2) % 4) if exits >> d & 1), h)
+     for h in range(4) for exits in range(16)])
+
+# the number of cost lists kept by the flood cache unless set_cache_size is used
+FLOOD_CACHE_SIZE = 2
+
+# flood engines
+FLOOD_QUEUE = 0     # a queue of cells, processed one at a time
+FLOOD_BITBOARD = 1  # the whole wavefront at once as a big integer
+
+# the kinds of entry in a FloodLog
+LOG_FLOOD = 0     # a full flood with the queue
+LOG_BITBOARD = 1  # a full flood with bitboards
+LOG_REPAIR = 2    # an incremental repair
+LOG_CACHE = 3     # costs copied from the flood cache
+LOG_NAMES = ('flood', 'bitboard', 'repair', 'cache')
+
+# the number of wall changes remembered for an incremental flood repair.
+# If more walls than this change between floods, a full flood is done instead
+MAX_WALL_CHANGES = 32
+
+
+class RunCosts:
+    """
+    A simple model of how long the mouse takes to run through the maze.
+    Used by Maze.plan_speed_run() to find the fastest route rather than
+    the one with the fewest cells.
+
+    All times are integers in whatever units you like - milliseconds perhaps.
+
+      cell   - the time for a cell at the start or end of a straight
+      fastest - the time for a cell at full speed
+      accel  - how much quicker each cell gets as the mouse speeds up
+      turn   - the time for a 90 degree turn
+      around - the time to turn around
+
+    A straight starts and ends at the speed used for turns. The mouse speeds
+    up until it reaches full speed or has to slow down for the end of the
+    straight so long straights are much quicker per cell than short ones.
+    """
+    __slots__ = ('cell', 'fastest', 'accel', 'turn', 'around')
+
+    def __init__(self, cell=10, fastest=4, accel=2, turn=8, around=30):
+        self.cell = cell
+        self.fastest = fastest
+        self.accel = accel
+        self.turn = turn
+        self.around = around
+
+    def straight(self, cells):
+        """
+        The time to run straight through the given number of cells
+        """
+        time = 0
+        for i in range(cells):
+            time += max(self.fastest, self.cell - self.accel * min(i, cells - 1 - i))
+        return time
 
-class Maze:
 
-    def __init__(self, size=16):
+class FloodLog:
+    """
+    A ring buffer with the details of the last few floods. Turn it on with
+    maze.set_flood_log(size) and every flood, and every call to
+    flood_for_search or flood_for_speed_run, adds an entry. When it is full,
+    the oldest entry is overwritten. The buffer is allocated once so
+    recording does not make any garbage.
+
+    Each entry has the kind of flood (see LOG_NAMES), the cells taken off the
+    queue, the longest the queue got, the number of exits tested, the time in
+    microseconds, the mask and the first target cell. The queue counters are
+    only kept by the queue flood and are zero for the other kinds.
+    """
+    __slots__ = ('size', 'count', 'kind', 'dequeued', 'peak', 'edges', 'us', 'mask', 'target')
+
+    FIELDS = ('kind', 'dequeued', 'peak', 'edges', 'us', 'mask', 'target')
+
+    def __init__(self, size=32):
         self.size = size
-        self.MAX_COST = self.size * self.size
-        self.cost = [self.MAX_COST for _ in range(self.size * self.size)]
-        self.walls = [ALL_UNKNOWN for _ in range(self.size * self.size)]
+        self.count = 0  # entries ever recorded
+        self.kind = bytearray(size)
+        self.mask = bytearray(size)
+        self.dequeued = array('I', [0]) * size
+        self.peak = array('I', [0]) * size
+        self.edges = array('I', [0]) * size
+        self.us = array('I', [0]) * size
+        self.target = array('i', [0]) * size
+
+    def record(self, kind, dequeued, peak, edges, us, mask, targets):
+        i = self.count % self.size
+        self.kind[i] = kind
+        self.dequeued[i] = dequeued
+        self.peak[i] = peak
+        self.edges[i] = edges
+        self.us[i] = us
+        self.mask[i] = mask
+        self.target[i] = targets[0] if targets else -1
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def clear(self):
+        self.count = 0
+
+    def entries(self):
+        """
+        Return the entries as a list of tuples in the order of FIELDS,
+        oldest first
+        """
+        result = []
+        for n in range(self.count - len(self), self.count):
+            i = n % self.size
+            result.append((LOG_NAMES[self.kind[i]], self.dequeued[i], self.peak[i],
+                           self.edges[i], self.us[i], self.mask[i], self.target[i]))
+        return result
+
+    def dump(self, write=print):
+        """
+        Write the entries as lines of comma separated values with a heading.
+        By default they are printed, which sends them over the serial port
+        on the robot.
+        """
+        write(",".join(self.FIELDS))
+        for entry in self.entries():
+            write(",".join([str(value) for value in entry]))
+
+
+class Maze:
+    # Fixed attributes make for smaller, faster objects in MicroPython
+    __slots__ = ('size', 'width', 'height', 'MAX_COST', 'cost', 'walls', 'mask', 'goals',
+                 'incremental', 'flood_mask', 'flood_targets', 'changed_walls',
+                 'queue', 'clear_cost', 'engine', 'edges', 'search_cost',
+                 'route_cache', 'gradient', 'version', 'flood_cache',
+                 'cache_size', 'flood_log', 'slice_cost', 'slice_queue',
+                 'slice_head', 'slice_tail', 'slice_target', 'slice_mask',
+                 'slice_version', 'explore_cost', 'explore_start_cost',
+                 'explore_walls', 'explore_version', 'explore_targets',
+                 'explore_route', 'explore_floods')
+
+    def __init__(self, width=16, height=None, size=None):
+        # size is the old name for the width of a square maze
+        if size is not None:
+            width = size
+        self.gradient = None
+        self.allocate(width, height)
         self.mask = OPEN_MAZE_MASK
-        self.goal_cell = self.cell_id(7, 7)
+        self.goals = self.default_goals()
+        self.incremental = False
+        self.engine = FLOOD_QUEUE
+        self.flood_mask = None
+        self.flood_targets = None
+        self.changed_walls = None
+        self.route_cache = None
+        self.version = 0
+        self.flood_cache = []
+        self.cache_size = FLOOD_CACHE_SIZE
+        self.flood_log = None
+        self.explore_floods = 0
         self.init_walls()
 
     def __str__(self) -> str:
@@ -63,17 +253,106 @@ class Maze:
 
     # TODO: add a __repr__ method that will prodiuce a Python declaration?
 
+    def allocate(self, width, height=None):
+        """
+        Create the buffers for a maze of the given size. The maze is square
+        unless the height is given as well as the width.
+        Everything the flood needs is allocated here, once, so that
+        flooding and re-initialising the maze do not make any garbage.
+        Costs and the flood queue are arrays of unsigned 16 bit numbers
+        unless the maze is too big for that. Walls need only one byte per cell.
+
+        Cells are numbered up each column in turn so the cell to the East
+        is height cells further on. size is the longer side, which is
+        the same as width and height in the usual square maze.
+        """
+        if height is None:
+            height = width
+        self.width = width
+        self.height = height
+        self.size = max(width, height)
+        cells = width * height
+        self.MAX_COST = cells
+        typecode = self.cost_typecode()
+        self.clear_cost = array(typecode, [cells]) * cells
+        self.cost = array(typecode, self.clear_cost)
+        self.search_cost = array(typecode, self.clear_cost)
+        # flood_dual() can put each cell in the queue twice
+        self.queue = array(typecode, [0]) * (2 * cells)
+        self.walls = bytearray([ALL_UNKNOWN]) * cells
+        self.edges = {}
+        if self.gradient is not None:
+            self.gradient = bytearray(cells * DIR_COUNT)
+        # the sliced flood makes its own buffers when it is first used
+        self.slice_cost = None
+        self.slice_queue = None
+        self.slice_head = None
+        # and so do frontier_cells()
+        self.explore_cost = None
+        self.explore_start_cost = None
+        self.explore_walls = None
+
     def cell_id(self, x, y):
-        return y + x * self.size
+        return y + x * self.height
 
     def cell_xy(self, cell):
-        return (cell // self.size, cell % self.size)
+        return (cell // self.height, cell % self.height)
 
     def get_goal(self):
-        return self.goal_cell
+        """
+        Return the first cell in the goal set.
+        Kept for code that only deals with a single goal cell
+        """
+        return self.goals[0]
 
     def set_goal(self, cell):
-        self.goal_cell = cell
+        """
+        Make the goal set a single cell
+        """
+        self.goals = [cell]
+        self.version += 1
+
+    def get_goals(self):
+        """
+        Return the list of cells that make up the goal area.
+        It is a copy so change the goals with set_goals()
+        """
+        return list(self.goals)
+
+    def set_goals(self, cells):
+        """
+        Set the list of cells that make up the goal area.
+        A flood will treat every one of them as a target with zero cost
+        """
+        self.goals = list(cells)
+        self.version += 1
+
+    def default_goals(self):
+        """
+        Return the cells of the goal area in the centre of the maze.
+        For a classic 16x16 maze that is the 2x2 square with (7,7) in the
+        bottom left corner. For a half-size 32x32 maze it is the square
+        with (15,15) in the bottom left corner. A maze with an odd size has
+        a single centre cell. In a rectangular maze, the goal is two cells
+        wide or high if that side is even and one if it is odd.
+        """
+        mid_x = self.width // 2
+        mid_y = self.height // 2
+        xs = [mid_x] if self.width % 2 else [mid_x - 1, mid_x]
+        ys = [mid_y] if self.height % 2 else [mid_y - 1, mid_y]
+        return [self.cell_id(x, y) for x in xs for y in ys]
+
+    def targets(self, target=None):
+        """
+        Turn a flood target into a list of cells.
+        The target can be a single cell, a list of cells or None to mean
+        the current goal set
+        """
+        if target is None:
+            return self.goals
+        if isinstance(target, int):
+            return [target]
+        return target
 
     def init_walls(self):
         """
@@ -82,62 +361,183 @@ class Maze:
         Mark the start cell walls
         Does not set the goal area
         """
-        self.walls = [ALL_UNKNOWN for _ in range(self.size * self.size)]
-        for cell in range(self.size):
-            self.set_wall(self.cell_id(cell, 0), DIR_SOUTH, WALL_PRESENT)
-            self.set_wall(self.cell_id(cell, self.size-1),
+        self.edges = {}
+        walls = self.walls
+        for cell in range(self.width * self.height):
+            walls[cell] = ALL_UNKNOWN
+        for x in range(self.width):
+            self.set_wall(self.cell_id(x, 0), DIR_SOUTH, WALL_PRESENT)
+            self.set_wall(self.cell_id(x, self.height-1),
                           DIR_NORTH, WALL_PRESENT)
-            self.set_wall(self.cell_id(0, cell), DIR_WEST,  WALL_PRESENT)
-            self.set_wall(self.cell_id(self.size-1, cell),
+        for y in range(self.height):
+            self.set_wall(self.cell_id(0, y), DIR_WEST,  WALL_PRESENT)
+            self.set_wall(self.cell_id(self.width-1, y),
                           DIR_EAST, WALL_PRESENT)
         self.set_wall(0, DIR_EAST, WALL_PRESENT)
         self.set_wall(0, DIR_NORTH, WALL_ABSENT)
+        self.changed_walls = None
+        self.version += 1
 
     def init_walls_from_string(self, lines):
         """
-        Read a maze stored as a list of lines of text. The format is
-        the same as the output of get_string and the mazefiles available at
+        Read a maze stored as lines of text. The format is the same as the
+        output of get_maze_string and the mazefiles available at
         https://github.com/micromouseonline/mazefiles
+
+        lines can be a list of strings, any other iterator of lines such as an
+        open file, a single string holding the whole maze or the name of a file.
+        The maze can be any size or shape. If any cells are marked with
+        a 'G', they become the goal, otherwise the goal is the centre of the
+        maze. Lines that have lost their trailing spaces are padded out to
+        the length of the first line. A line that is longer than that raises
+        a ValueError. The maze ends at the first blank line, or any other
+        line that cannot be the next line of the maze, after a line of posts.
+        Anything after that is ignored.
+
+        Each line is cut up with a slice and the walls for every cell are
+        worked out in one go so this is quick enough for large collections.
         """
-        ROW_DIVISOR = 2
-        COL_DIVISOR = 4
-        self.size = max(len(lines) // ROW_DIVISOR, len(lines[0]) // COL_DIVISOR)
-        self.walls = [ALL_UNKNOWN for _ in range(self.size * self.size)]
-        cell_y = self.size - 1
-        for i, line in enumerate(lines):
-            if i >= ROW_DIVISOR * self.size:
+        if isinstance(lines, str):
+            if '\n' in lines:
+                lines = lines.split('\n')
+            else:
+                with open(lines) as file:
+                    return self.init_walls_from_string(file)
+        # the wall states from each line, top to bottom. Even lines have the
+        # walls between rows and odd lines have the walls between columns
+        rows = []
+        marks = []
+        length = 0
+        number = 0
+        for line in lines:
+            number += 1
+            line = line.rstrip()
+            if not line:
+                if rows and len(rows) % 2:
+                    break
                 continue
-            line = line.rstrip()  # remove \n
-
-            if i % ROW_DIVISOR == 0:  # north walls
-                cell_x = 0
-                for j in range(2, len(line), COL_DIVISOR):
-                    c = line[j]
-                    wall_state = WALL_PRESENT if c == '-' else WALL_ABSENT
-                    self.update_wall(self.cell_id(cell_x, cell_y), DIR_NORTH, wall_state)
-                    cell_x += 1
-
-            else:  # west walls
-                cell_x = 0
-                for j in range(0, len(line), COL_DIVISOR):
-                    c = line[j]
-                    wall_state = WALL_PRESENT if c == '|' else WALL_ABSENT
-                    self.update_wall(self.cell_id(cell_x, cell_y), DIR_WEST, wall_state)
-                    cell_x += 1
-                wall_state = WALL_PRESENT if line[-1] == '|' else WALL_ABSENT
-                self.update_wall(self.cell_id(self.size - 1, cell_y), DIR_EAST, wall_state)
-
-            cell_y -= i % ROW_DIVISOR
-
-        # special case for the last line
-        cell_y = 0
-        cell_x = 0
-        for j in range(2, len(line), COL_DIVISOR):
-            c = line[j]
-            wall_state = WALL_PRESENT if c == '-' else WALL_ABSENT
-            self.set_wall(self.cell_id(cell_x, cell_y), DIR_SOUTH, wall_state)
-            cell_x += 1
-        return
+            if len(rows) % 2 == 0:
+                if line.strip('o+- '):
+                    if rows:
+                        break
+                    raise ValueError(f"maze line {number} is not a line of posts")
+            elif line[0] not in '| ':
+                break
+            if not rows:
+                length = len(line)
+            elif len(line) > length:
+                raise ValueError(f"maze line {number} is longer than the first line")
+            else:
+                line = line + ' ' * (length - len(line))
+            if len(rows) % 2:
+                rows.append(bytes([WALL_PRESENT if c == '|' else WALL_ABSENT for c in line[0::4]]))
+                column = line.find('G')
+                while column >= 0:
+                    marks.append((len(rows) // 2 - 1, column // 4))
+                    column = line.find('G', column + 1)
+            else:
+                rows.append(bytes([WALL_PRESENT if c == '-' else WALL_ABSENT for c in line[2::4]]))
+
+        if len(rows) % 2 == 0:
+            raise ValueError("maze text must start and end with a line of posts")
+        height = len(rows) // 2
+        width = len(rows[0])
+        self.resize(width, height)
+        walls = self.walls
+        for y in range(height):
+            row = 2 * (height - 1 - y)
+            north = rows[row]
+            west = rows[row + 1]
+            south = rows[row + 2]
+            cell = y
+            for x in range(width):
+                walls[cell] = north[x] | west[x + 1] << 2 | south[x] << 4 | west[x] << 6
+                cell += height
+        if marks:
+            self.set_goals(sorted(set(self.cell_id(x, height - 1 - row) for row, x in marks)))
+        else:
+            self.set_goals(self.default_goals())
+        self.walls_replaced()
+
+    def resize(self, width, height=None):
+        """
+        Change the size of the maze if needed. Everything is reallocated
+        and the goal goes back to the centre of the maze
+        """
+        if height is None:
+            height = width
+        if width != self.width or height != self.height:
+            self.allocate(width, height)
+            self.goals = self.default_goals()
+
+    def resize_to_fit(self, cells, height=None):
+        """
+        Resize the maze to hold the given number of cells. The maze is
+        square unless the height is given.
+        """
+        if height is None:
+            height = int(cells ** 0.5 + 0.5)
+        width = cells // height
+        if width * height != cells:
+            raise ValueError("maze data does not fit the size")
+        self.resize(width, height)
+
+    def walls_replaced(self):
+        """
+        Call this after changing the walls without using set_wall.
+        Anything that depends on the old walls is thrown away.
+        """
+        self.edges = {}
+        self.changed_walls = None
+        self.version += 1
+
+    def init_walls_from_maz(self, data, height=None):
+        """
+        Load the walls from the bytes of a standard binary .maz file.
+        There is one byte for each cell, in the same order as the cells in
+        the maze, with 1 for a wall to the North, 2 East, 4 South and 8 West.
+        All the walls become known walls or exits. The size of the maze comes
+        from the number of bytes - 256 for a classic maze. Give the height
+        if the maze is not square.
+
+        The walls are converted with a table in one go, not one at a time.
+        """
+        self.resize_to_fit(len(data), height)
+        walls = self.walls
+        if hasattr(data, 'translate'):
+            walls[:] = data.translate(MAZ_TO_WALLS)
+        else:
+            # MicroPython has no translate
+            for cell in range(len(data)):
+                walls[cell] = MAZ_TO_WALLS[data[cell]]
+        self.walls_replaced()
+
+    def get_maz(self):
+        """
+        Return the walls as the bytes of a standard binary .maz file.
+        Virtual walls count as walls. Unknown walls count as exits, as they
+        do with the OPEN_MAZE_MASK.
+        """
+        if hasattr(self.walls, 'translate'):
+            return bytes(self.walls.translate(WALLS_TO_MAZ))
+        return bytes([WALLS_TO_MAZ[walls] for walls in self.walls])
+
+    def init_walls_from_packed(self, data, height=None):
+        """
+        Load the walls from bytes made by get_packed(). Give the height
+        if the maze is not square.
+        """
+        self.resize_to_fit(len(data), height)
+        self.walls[:] = data
+        self.walls_replaced()
+
+    def get_packed(self):
+        """
+        Return the walls exactly as they are stored, with two bits for each
+        direction in each cell. Unlike a .maz file, this keeps track of which
+        walls are unknown or virtual so it is a complete copy of the map.
+        """
+        return bytes(self.walls)
 
     def set_wall(self, cell, direction, state):
         """
@@ -145,18 +545,25 @@ class Maze:
         This would normally only get used when initialising the maze - either
         as a blank maze or when copying a pre-defined maze
         """
-        if cell < 0 or cell >= self.size * self.size:
+        if cell < 0 or cell >= self.MAX_COST:
             return
         x, y = self.cell_xy(cell)
         wall = state << direction * 2
         mask = ~(WALL_MASK << direction * 2)
         self.walls[cell] &= mask
         self.walls[cell] |= wall
-        if direction == DIR_NORTH and y < self.size - 1:
+        self.version += 1
+        changed = self.changed_walls
+        if changed is not None:
+            if len(changed) < MAX_WALL_CHANGES:
+                changed.append(cell * DIR_COUNT + direction)
+            else:
+                self.changed_walls = None
+        if direction == DIR_NORTH and y < self.height - 1:
             next = self.neighbour(cell, DIR_NORTH)
             self.walls[next] &= ~(WALL_MASK << DIR_SOUTH * 2)
             self.walls[next] |= (state << DIR_SOUTH * 2)
-        elif direction == DIR_EAST and x < self.size - 1:
+        elif direction == DIR_EAST and x < self.width - 1:
             next = self.neighbour(cell, DIR_EAST)
             self.walls[next] &= ~(WALL_MASK << DIR_WEST * 2)
             self.walls[next] |= (state << DIR_WEST * 2)
@@ -168,6 +575,8 @@ class Maze:
             next = self.neighbour(cell, DIR_WEST)
             self.walls[next] &= ~(WALL_MASK << DIR_EAST * 2)
             self.walls[next] |= (state << DIR_EAST * 2)
+        if self.edges:
+            self.update_edges(cell, direction)
 
     def update_wall(self, cell, direction, state):
         """
@@ -175,13 +584,73 @@ class Maze:
         It will ensure that wall state can only be changed once.
         If you absolutely, positively have to set the wall state, use set_wall.
         """
-        if cell < 0 or cell >= self.size * self.size:
+        if cell < 0 or cell >= self.MAX_COST:
             return
         this_wall = (self.walls[cell] >> direction * 2) & WALL_MASK
         if this_wall != WALL_UNKNOWN:
             return
         self.set_wall(cell, direction, state)
 
+    def update_walls(self, updates):
+        """
+        Update a batch of walls in one go, such as all the walls seen in one
+        sensor frame. updates is a list of (cell, direction, state) and a state
+        of None is skipped. As with update_wall, only unknown walls are changed.
+
+        The walls on both sides are changed directly rather than through
+        set_wall and neighbour so this is a lot quicker than separate calls.
+        Returns True if any wall changed. If not, there is nothing new
+        to flood for.
+        """
+        walls = self.walls
+        height = self.height
+        cells = self.width * height
+        offsets = (1, height, -1, -height)
+        changed = self.changed_walls
+        learned = False
+        for cell, direction, state in updates:
+            if state is None or cell < 0 or cell >= cells:
+                continue
+            shift = direction * 2
+            here = walls[cell]
+            if (here >> shift) & WALL_MASK != WALL_UNKNOWN:
+                continue
+            walls[cell] = here & WALL_CLEAR[direction] | state << shift
+            y = cell % height
+            if direction == DIR_NORTH:
+                inside = y < height - 1
+            elif direction == DIR_EAST:
+                inside = cell + height < cells
+            elif direction == DIR_SOUTH:
+                inside = y > 0
+            else:
+                inside = cell >= height
+            if inside:
+                next = cell + offsets[direction]
+                opposite = (direction + 2) % DIR_COUNT
+                walls[next] = walls[next] & WALL_CLEAR[opposite] | state << opposite * 2
+            learned = True
+            if changed is not None:
+                if len(changed) < MAX_WALL_CHANGES:
+                    changed.append(cell * DIR_COUNT + direction)
+                else:
+                    changed = self.changed_walls = None
+            if self.edges:
+                self.update_edges(cell, direction)
+        if learned:
+            self.version += 1
+        return learned
+
+    def update_walls_relative(self, cell, heading, left, front, right):
+        """
+        Update the walls to the left, front and right of a mouse in the cell
+        facing along the heading, as seen by its sensors. Each is a wall state
+        or None if it was not seen. Returns True if any wall changed.
+        """
+        return self.update_walls(((cell, (heading + 3) % DIR_COUNT, left),
+                                  (cell, heading, front),
+                                  (cell, (heading + 1) % DIR_COUNT, right)))
+
     def set_mask(self, mask):
         """
         The mask determines the view of the maze
@@ -194,6 +663,24 @@ class Maze:
         """
         self.mask = mask
 
+    def set_engine(self, engine):
+        """
+        Choose the way flood() works. The result is always the same.
+        FLOOD_QUEUE is the default and processes one cell at a time.
+        FLOOD_BITBOARD treats the whole wavefront as one big integer and
+        moves it a step at a time with a few shifts and ANDs. See flood_bitboard()
+        """
+        self.engine = engine
+
+    def set_incremental(self, enabled):
+        """
+        In incremental mode, flood_for_search and flood_for_speed_run
+        repair the existing cost list after wall changes rather than
+        flooding the whole maze again. See repair_flood().
+        Calling flood() directly always does a full flood.
+        """
+        self.incremental = enabled
+
     def cell_has_wall(self, cell, direction):
         """
         Returns True if there is a wall in the given cell and direction
@@ -226,20 +713,20 @@ class Maze:
     def neighbour(self, cell, direction):
         """
         Calculate and return the offset of a neighbouring cell.
-        The maze is assumed to be square and the returned value will
-        wrap around the edges of the maze
+        The returned value will wrap around the edges of the maze
         There is no error checking for the direction
         """
+        cells = self.width * self.height
         neighbour = cell
         if direction == DIR_NORTH:
             neighbour = cell + 1
         elif direction == DIR_EAST:
-            neighbour = cell + self.size
+            neighbour = cell + self.height
         elif direction == DIR_SOUTH:
-            neighbour = cell + self.size*self.size - 1
+            neighbour = cell + cells - 1
         elif direction == DIR_WEST:
-            neighbour = cell + self.size * self.size - self.size
-        return neighbour % (self.size * self.size)
+            neighbour = cell + cells - self.height
+        return neighbour % cells
 
     def direction_to_smallest(self, cell, start_direction=DIR_NORTH):
         """
@@ -259,13 +746,13 @@ class Maze:
             if left_cost < cost:
                 dir = left_dir
                 cost = left_cost
-        right_dir = (dir + 1) % DIR_COUNT
+        right_dir = (start_direction + 1) % DIR_COUNT
         if self.cell_has_exit(cell, right_dir):
             right_cost = self.cost[self.neighbour(cell, right_dir)]
             if right_cost < cost:
                 dir = right_dir
                 cost = right_cost
-        back_dir = (dir + 2) % DIR_COUNT
+        back_dir = (start_direction + 2) % DIR_COUNT
         if self.cell_has_exit(cell, back_dir):
             back_cost = self.cost[self.neighbour(cell, back_dir)]
             if back_cost < cost:
@@ -274,58 +761,211 @@ class Maze:
 
         return dir
 
+    def set_gradient(self, enabled):
+        """
+        When enabled, every flood also fills in a table of the direction to
+        take from each cell for each heading. Then next_direction() gives the
+        same answer as direction_to_smallest() with a single lookup.
+        The table needs four bytes per cell.
+        """
+        if enabled:
+            self.gradient = bytearray(self.width * self.height * DIR_COUNT)
+            if self.flood_targets is not None:
+                self.build_gradient(self.flood_mask)
+        else:
+            self.gradient = None
+
+    def build_gradient(self, mask, cells=None):
+        """
+        Fill in the gradient table from the costs, for all the cells or just
+        the ones listed, looking through the walls with the given mask.
+        The flood methods call this for you.
+        """
+        MASK = WALL_MASK & mask
+        cost = self.cost
+        walls = self.walls
+        gradient = self.gradient
+        offsets = (1, self.height, -1, -self.height)
+        NO_EXIT = self.MAX_COST + 1
+        if cells is None:
+            cells = range(self.width * self.height)
+        for cell in cells:
+            walls_here = walls[cell]
+            smallest = NO_EXIT
+            exits = 0
+            for direction in range(DIR_COUNT):
+                if (walls_here >> direction * 2) & MASK == 0:
+                    neighbour_cost = cost[cell + offsets[direction]]
+                    if neighbour_cost < smallest:
+                        smallest = neighbour_cost
+                        exits = 1 << direction
+                    elif neighbour_cost == smallest:
+                        exits |= 1 << direction
+            index = cell * DIR_COUNT
+            gradient[index] = GRADIENT_CHOICE[exits]
+            gradient[index + 1] = GRADIENT_CHOICE[16 + exits]
+            gradient[index + 2] = GRADIENT_CHOICE[32 + exits]
+            gradient[index + 3] = GRADIENT_CHOICE[48 + exits]
+
+    def next_direction(self, cell, heading=DIR_NORTH):
+        """
+        Look up the direction to the smallest neighbour in the gradient table.
+        Gives the same answer as direction_to_smallest() but gradients must
+        be turned on with set_gradient(True) before flooding.
+        Floods that stop early, flood_to_cell() and a dual flood that gives
+        up, do not fill in the table. After those it falls back to
+        direction_to_smallest().
+        """
+        if self.flood_targets is None:
+            return self.direction_to_smallest(cell, heading)
+        return self.gradient[cell * DIR_COUNT + heading]
+
+    def route_from_costs(self, start=0, heading=DIR_NORTH):
+        """
+        Follow the costs downhill from the start cell and return the list of
+        cells passed through on the way to the target, including both ends.
+        The maze must have been flooded first. The way is chosen in the
+        same way as direction_to_smallest() so that ahead is preferred,
+        then left, right and back. If there is no way to the target, the
+        route stops where it gets stuck.
+        """
+        cell = start
+        route = [cell]
+        while self.cost[cell] > 0:
+            heading = self.direction_to_smallest(cell, heading)
+            next = self.neighbour(cell, heading)
+            if self.cost[next] >= self.cost[cell]:
+                break
+            cell = next
+            route.append(cell)
+        return route
+
+    def moves_from_route(self, route, heading=DIR_NORTH):
+        """
+        Turn a list of cells, like the ones from route_from_costs() or
+        plan_speed_run(), into a compact list of moves for a mouse that starts
+        on the first cell facing the given heading.
+        Each move is either a positive number of cells to go forward or
+        one of MOVE_LEFT, MOVE_RIGHT or MOVE_AROUND to turn on the spot.
+        """
+        steps = (1, self.height, -1, -self.height)
+        moves = []
+        forward = 0
+        for here, there in zip(route, route[1:]):
+            direction = steps.index(there - here)
+            turn = (direction - heading) % DIR_COUNT
+            if turn != 0:
+                if forward:
+                    moves.append(forward)
+                    forward = 0
+                moves.append((0, MOVE_RIGHT, MOVE_AROUND, MOVE_LEFT)[turn])
+                heading = direction
+            forward += 1
+        if forward:
+            moves.append(forward)
+        return moves
+
+    def compile_route(self, start=0, heading=DIR_NORTH):
+        """
+        Return the list of moves that follows the costs from the start cell
+        to the target of the last flood. See moves_from_route().
+        The result is kept until the walls or goals change or the maze is
+        flooded differently so asking again costs nothing.
+        Do not change the list you get back.
+        """
+        cache = self.route_cache
+        if (cache is not None and cache[0] == self.version and cache[1] == start
+                and cache[2] == heading and cache[3] == self.flood_mask
+                and cache[4] == self.flood_targets):
+            return cache[5]
+        moves = self.moves_from_route(self.route_from_costs(start, heading), heading)
+        if self.flood_targets is not None:
+            self.route_cache = (self.version, start, heading, self.flood_mask,
+                                self.flood_targets, moves)
+        return moves
+
     def get_maze_string(self, view=VIEW_PLAIN):
         """
-        Print a visual representation of the maze
-        If view == VIEW_COSTS, print the cost of each cell
+        Return a visual representation of the maze as a string.
+        The view decides what goes in each cell:
+
+          VIEW_PLAIN   - nothing, except an S in the start cell
+          VIEW_COSTS   - the cost of each cell. Cells that cannot be reached
+                         show MAX_COST, or --- if that is 1000 or more. Other
+                         costs of 1000 or more are shown in thousands, as 12k,
+                         and *** if they are too big even for that
+          VIEW_DIRS    - an arrow pointing to the neighbour with the smallest cost
+          VIEW_VISITED - a * in every cell that has been visited
         """
-        old_mask = self.mask
-        self.mask = OPEN_MAZE_MASK
-        str = ""
-        for y in range(self.size - 1, -1, -1):
-            line = "o"
-            for x in range(self.size):
-                if self.cell_has_exit(self.cell_id(x, y), DIR_NORTH):
-                    line += "   o"
-                else:
-                    line += "---o"
-            str += line + "\n"
-            line = ""
-            for x in range(self.size):
-                cell = self.cell_id(x, y)
-                if self.cell_has_exit(cell, DIR_WEST):
-                    line += " "
-                else:
-                    line += "|"
-                # now the cell space
-                if cell == 0 and view == VIEW_PLAIN:
-                    line += " S "
-                elif view == VIEW_COSTS and self.cost[cell] is not None:
-                    line += f"{self.cost[cell]:>3}"
-                else:
-                    line += "   "
-            if self.cell_has_exit(self.cell_id(self.size-1, y), DIR_EAST):
-                line += " "
-            else:
-                line += "|"  # Rightmost boundary
-            str += line + "\n"
-        line = "+"
-        for x in range(self.size):
-            if self.cell_has_exit(self.cell_id(x, 0), DIR_SOUTH):
-                line += "   o"
-            else:
-                line += "---o"
-        # print(line)
-        str += line + "\n"
-        self.mask = old_mask
-        return str
+        return "\n".join(self.get_maze_rows(view)) + "\n"
+
+    def cell_text(self, view):
+        """
+        Return a list with the three characters to show in each cell
+        """
+        cells = self.width * self.height
+        if view == VIEW_COSTS:
+            # always three characters so that the rows stay the same width
+            MAX_COST = self.MAX_COST
+            return ["%3d" % cost if cost < 1000 else "---" if cost == MAX_COST
+                    else "%2dk" % (cost // 1000) if cost < 100000 else "***"
+                    for cost in self.cost[:cells]]
+        if view == VIEW_DIRS:
+            return [DIR_TEXT[self.direction_downhill(cell)] for cell in range(cells)]
+        if view == VIEW_VISITED:
+            return [" * " if walls & ALL_UNKNOWN == 0 else "   " for walls in self.walls]
+        text = ["   "] * cells
+        if view == VIEW_PLAIN:
+            text[0] = " S "
+        return text
+
+    def direction_downhill(self, cell):
+        """
+        Return the direction of the open neighbour with the smallest cost
+        that is less than the cost of the cell, or DIR_COUNT if there is none.
+        This is what VIEW_DIRS shows.
+        """
+        cost = self.cost
+        walls = self.walls[cell]
+        best = cost[cell]
+        best_direction = DIR_COUNT
+        offsets = (1, self.height, -1, -self.height)
+        for direction in range(DIR_COUNT):
+            if walls >> direction * 2 & self.mask == 0 and cost[cell + offsets[direction]] < best:
+                best = cost[cell + offsets[direction]]
+                best_direction = direction
+        return best_direction
+
+    def get_maze_rows(self, view=VIEW_PLAIN):
+        """
+        Return the lines of get_maze_string() as a list without the newlines.
+        Walls are drawn if they are present or virtual, as they would be
+        with the OPEN_MAZE_MASK, but the mask of the maze is not changed.
+        Each line is joined from ready made pieces for speed.
+        """
+        height = self.height
+        walls = self.walls
+        text = self.cell_text(view)
+        rows = []
+        cells = self.width * height
+        for y in range(height - 1, -1, -1):
+            row = range(y, cells, height)
+            rows.append("o" + "".join([POST_TEXT[walls[cell] & OPEN_MAZE_MASK] for cell in row]))
+            rows.append("".join([SIDE_TEXT[walls[cell] >> 6 & OPEN_MAZE_MASK] + text[cell] for cell in row])
+                        + SIDE_TEXT[walls[cells - height + y] >> 2 & OPEN_MAZE_MASK])
+        rows.append("+" + "".join([POST_TEXT[walls[cell] >> 4 & OPEN_MAZE_MASK] for cell in range(0, cells, height)]))
+        return rows
 
     @micropython.native
-    def flood(self, target_cell):
+    def flood(self, target=None):
         """
         General purpose maze flood fills te cost list with the Manhattan
         from the target cell for every other cell in the maze.
 
+        The target can be a single cell or a list of cells. With no target, the
+        current goal set is used. Every target cell is seeded with a cost of zero
+        so that a single pass gives the distance to the nearest of them.
+
         Do not use this function directly. Instead use one of the special functions
         listed at the end:
 
@@ -355,6 +995,10 @@ class Maze:
 
         This is not ideal in terms of maintenance but speed is king.
         """
+        if self.flood_log is not None:
+            return self.flood_logged(target)
+        if self.engine == FLOOD_BITBOARD:
+            return self.flood_bitboard(target)
         MASK = WALL_MASK & self.mask
         NORTH_MASK = MASK << DIR_NORTH * 2
         EAST_MASK = MASK << DIR_EAST * 2
@@ -362,67 +1006,1207 @@ class Maze:
         WEST_MASK = MASK << DIR_WEST * 2
         MAX_COST = self.MAX_COST
 
-        self.cost = [MAX_COST for _ in range(self.size * self.size)]
-        self.cost[target_cell] = 0
+        height = self.height
+        walls = self.walls
+        cost = self.cost
+        cost[:] = self.clear_cost
         head = 0
         tail = 0
-        queue = [0 for _ in range(self.size * self.size)]
-        queue[tail] = target_cell
-        tail += 1
+        queue = self.queue
+        targets = self.targets(target)
+        for cell in targets:
+            if cost[cell] != 0:
+                cost[cell] = 0
+                queue[tail] = cell
+                tail += 1
         while head < tail:
             here = queue[head]
             head += 1
-            walls_here = self.walls[here]
-            next_cost = self.cost[here] + 1
+            walls_here = walls[here]
+            next_cost = cost[here] + 1
 
             if walls_here & NORTH_MASK == 0:
                 neighbour = here + 1
-                if self.cost[neighbour] == MAX_COST:
-                    self.cost[neighbour] = next_cost
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
                     queue[tail] = neighbour
                     tail += 1
 
             if walls_here & EAST_MASK == 0:
-                neighbour = here + self.size
-                if self.cost[neighbour] == MAX_COST:
-                    self.cost[neighbour] = next_cost
+                neighbour = here + height
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
                     queue[tail] = neighbour
                     tail += 1
 
             if walls_here & SOUTH_MASK == 0:
                 neighbour = here - 1
-                if self.cost[neighbour] == MAX_COST:
-                    self.cost[neighbour] = next_cost
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
                     queue[tail] = neighbour
                     tail += 1
 
             if walls_here & WEST_MASK == 0:
-                neighbour = here - self.size
-                if self.cost[neighbour] == MAX_COST:
-                    self.cost[neighbour] = next_cost
+                neighbour = here - height
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+        self.flood_mask = self.mask
+        self.flood_targets = tuple(targets)
+        self.changed_walls = []
+        if self.gradient is not None:
+            self.build_gradient(self.mask)
+        return cost[0]
+
+    @micropython.native
+    def flood_logged(self, target=None):
+        """
+        The same as flood() but it counts what it does and records it in
+        the flood log. flood() uses this instead when the log is turned on
+        so that the normal flood does not have to count anything.
+        """
+        start = ticks_us()
+        if self.engine == FLOOD_BITBOARD:
+            result = self.flood_bitboard(target)
+            self.flood_log.record(LOG_BITBOARD, 0, 0, 0, ticks_diff(ticks_us(), start),
+                                  self.mask, self.targets(target))
+            return result
+        MASK = WALL_MASK & self.mask
+        NORTH_MASK = MASK << DIR_NORTH * 2
+        EAST_MASK = MASK << DIR_EAST * 2
+        SOUTH_MASK = MASK << DIR_SOUTH * 2
+        WEST_MASK = MASK << DIR_WEST * 2
+        MAX_COST = self.MAX_COST
+
+        height = self.height
+        walls = self.walls
+        cost = self.cost
+        cost[:] = self.clear_cost
+        head = 0
+        tail = 0
+        peak = 0
+        edges = 0
+        queue = self.queue
+        targets = self.targets(target)
+        for cell in targets:
+            if cost[cell] != 0:
+                cost[cell] = 0
+                queue[tail] = cell
+                tail += 1
+        while head < tail:
+            if tail - head > peak:
+                peak = tail - head
+            here = queue[head]
+            head += 1
+            walls_here = walls[here]
+            next_cost = cost[here] + 1
+
+            if walls_here & NORTH_MASK == 0:
+                edges += 1
+                neighbour = here + 1
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if walls_here & EAST_MASK == 0:
+                edges += 1
+                neighbour = here + height
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if walls_here & SOUTH_MASK == 0:
+                edges += 1
+                neighbour = here - 1
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if walls_here & WEST_MASK == 0:
+                edges += 1
+                neighbour = here - height
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+        self.flood_mask = self.mask
+        self.flood_targets = tuple(targets)
+        self.changed_walls = []
+        if self.gradient is not None:
+            self.build_gradient(self.mask)
+        self.flood_log.record(LOG_FLOOD, head, peak, edges, ticks_diff(ticks_us(), start),
+                              self.mask, targets)
+        return cost[0]
+
+    def flood_start(self, target=None):
+        """
+        Start a flood that is done a few cells at a time by flood_step().
+        Use this when a full flood would take too long to fit between the
+        ticks of a control loop. The flood works in its own cost list and
+        queue so maze.cost keeps the result of the last flood until this one
+        is complete. That needs as much memory again as the cost list and queue.
+        The current mask is used for the whole flood.
+        """
+        if self.slice_cost is None:
+            typecode = self.cost_typecode()
+            self.slice_cost = array(typecode, self.clear_cost)
+            self.slice_queue = array(typecode, [0]) * (self.width * self.height)
+        cost = self.slice_cost
+        cost[:] = self.clear_cost
+        queue = self.slice_queue
+        tail = 0
+        for cell in self.targets(target):
+            if cost[cell] != 0:
+                cost[cell] = 0
+                queue[tail] = cell
+                tail += 1
+        self.slice_head = 0
+        self.slice_tail = tail
+        self.slice_target = target
+        self.slice_mask = self.mask
+        self.slice_version = self.version
+
+    @micropython.native
+    def flood_step(self, max_cells=32):
+        """
+        Carry on with the flood begun by flood_start(), taking no more than
+        max_cells cells off the queue. Returns True once the flood is complete.
+        Then the new costs become maze.cost - the two cost lists are swapped,
+        not copied - and the maze is in the same state as after flood().
+
+        If the walls or goals change before the flood is complete, it starts
+        again with the same target and mask. The same happens if this is
+        called after walls change once it is complete so, in a control loop,
+        just keep calling it. If flood_start() has not been called, the
+        flood starts for the goal.
+
+          maze.flood_start(target)
+          while not maze.flood_step(64):
+              run_the_motors()
+        """
+        if self.slice_head is None:
+            self.flood_start()
+        elif self.slice_version != self.version:
+            mask = self.mask
+            self.mask = self.slice_mask
+            self.flood_start(self.slice_target)
+            self.mask = mask
+        head = self.slice_head
+        tail = self.slice_tail
+        if head < 0:
+            return True
+        MASK = WALL_MASK & self.slice_mask
+        NORTH_MASK = MASK << DIR_NORTH * 2
+        EAST_MASK = MASK << DIR_EAST * 2
+        SOUTH_MASK = MASK << DIR_SOUTH * 2
+        WEST_MASK = MASK << DIR_WEST * 2
+        MAX_COST = self.MAX_COST
+
+        height = self.height
+        walls = self.walls
+        cost = self.slice_cost
+        queue = self.slice_queue
+        stop = head + max_cells
+        while head < tail and head < stop:
+            here = queue[head]
+            head += 1
+            walls_here = walls[here]
+            next_cost = cost[here] + 1
+
+            if walls_here & NORTH_MASK == 0:
+                neighbour = here + 1
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
                     queue[tail] = neighbour
                     tail += 1
 
+            if walls_here & EAST_MASK == 0:
+                neighbour = here + height
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if walls_here & SOUTH_MASK == 0:
+                neighbour = here - 1
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if walls_here & WEST_MASK == 0:
+                neighbour = here - height
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+        self.slice_tail = tail
+        if head < tail:
+            self.slice_head = head
+            return False
+        # finished, so swap in the new costs
+        self.slice_head = -1
+        self.slice_cost = self.cost
+        self.cost = cost
+        self.flood_mask = self.slice_mask
+        self.flood_targets = tuple(self.targets(self.slice_target))
+        self.changed_walls = []
+        if self.gradient is not None:
+            self.build_gradient(self.slice_mask)
+        return True
+
+    def flood_complete(self):
+        """
+        True if the sliced flood has finished and nothing has changed since,
+        so maze.cost is up to date for its target
+        """
+        return self.slice_head == -1 and self.slice_version == self.version
+
+    def set_flood_log(self, size):
+        """
+        Keep a FloodLog of the last size floods in flood_log.
+        Zero turns the log off again, and then it costs nothing.
+        """
+        self.flood_log = FloodLog(size) if size else None
+
+    @micropython.native
+    def flood_to_cell(self, cell, target=None, neighbours=False):
+        """
+        Flood from the target, or the goal set, only as far as is needed to
+        know the cost of the given cell and return that cost.
+
+        With neighbours=True, the flood carries on until the cell itself has
+        been processed so that every open neighbour also has its final cost
+        and direction_to_smallest(cell) gives the right answer.
+
+        Cells further away than that are left with MAX_COST so the cost
+        list is only good for looking around the given cell. If the mouse is
+        close to the target, only a small part of the maze gets flooded.
+        """
+        MASK = WALL_MASK & self.mask
+        NORTH_MASK = MASK << DIR_NORTH * 2
+        EAST_MASK = MASK << DIR_EAST * 2
+        SOUTH_MASK = MASK << DIR_SOUTH * 2
+        WEST_MASK = MASK << DIR_WEST * 2
+        MAX_COST = self.MAX_COST
+        # the flood stops when the cell cost drops below the limit
+        # or, when looking for neighbours, once the cell is processed
+        limit = 0 if neighbours else MAX_COST
+
+        height = self.height
+        walls = self.walls
+        cost = self.cost
+        cost[:] = self.clear_cost
+        head = 0
+        tail = 0
+        queue = self.queue
+        for seed in self.targets(target):
+            if cost[seed] != 0:
+                cost[seed] = 0
+                queue[tail] = seed
+                tail += 1
+        while head < tail and cost[cell] >= limit:
+            here = queue[head]
+            head += 1
+            walls_here = walls[here]
+            next_cost = cost[here] + 1
+
+            if walls_here & NORTH_MASK == 0:
+                neighbour = here + 1
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if walls_here & EAST_MASK == 0:
+                neighbour = here + height
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if walls_here & SOUTH_MASK == 0:
+                neighbour = here - 1
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if walls_here & WEST_MASK == 0:
+                neighbour = here - height
+                if cost[neighbour] == MAX_COST:
+                    cost[neighbour] = next_cost
+                    queue[tail] = neighbour
+                    tail += 1
+
+            if here == cell:
+                break
+
+        # the cost list is incomplete so it cannot be repaired
+        self.flood_targets = None
+        return cost[cell]
+
+    def shortest_path(self, start, end):
+        """
+        Find the shortest route from the start cell to the end cell without
+        flooding the whole maze. Returns (distance, path) where path is the
+        list of cells from start to end. If there is no route, the result is
+        (MAX_COST, []).
+
+        Two searches go out a step at a time, one from each end, always
+        moving the one with fewer cells on its edge, until they meet. Only
+        the cells closer to one end or the other than the meeting point get
+        looked at. The current mask is used so unknown walls count as open or
+        closed just as they do for flood() and virtual walls are always closed.
+        The cost list is not touched.
+        """
+        if start == end:
+            return 0, [start]
+        mask = WALL_MASK & self.mask
+        height = self.height
+        offsets = (1, height, -1, -height)
+        walls = self.walls
+        # each side maps the cells it has reached to (parent, distance)
+        sides = ({start: (-1, 0)}, {end: (-1, 0)})
+        edges = ([start], [end])
+        depth = [0, 0]
+        best = self.MAX_COST
+        meet = -1
+        while edges[0] and edges[1]:
+            side = 0 if len(edges[0]) <= len(edges[1]) else 1
+            reached = sides[side]
+            other = sides[1 - side]
+            distance = depth[side] + 1
+            edge = []
+            for here in edges[side]:
+                walls_here = walls[here]
+                for direction in range(DIR_COUNT):
+                    if walls_here >> direction * 2 & mask:
+                        continue
+                    neighbour = here + offsets[direction]
+                    if neighbour in reached:
+                        continue
+                    reached[neighbour] = (here, distance)
+                    edge.append(neighbour)
+                    if neighbour in other:
+                        total = distance + other[neighbour][1]
+                        if total < best:
+                            best = total
+                            meet = neighbour
+            depth[side] = distance
+            edges = (edge, edges[1]) if side == 0 else (edges[0], edge)
+            # all the routes through this step have been seen so stop
+            if meet >= 0:
+                break
+        if meet < 0:
+            return self.MAX_COST, []
+        path = []
+        cell = meet
+        while cell >= 0:
+            path.append(cell)
+            cell = sides[0][cell][0]
+        path.reverse()
+        cell = sides[1][meet][0]
+        while cell >= 0:
+            path.append(cell)
+            cell = sides[1][cell][0]
+        return best, path
+
+    def path_to_nearest(self, start, cells, heading=DIR_NORTH):
+        """
+        Find the shortest route from the start cell to whichever of the cells
+        is nearest. Returns the list of cells from start to that cell, or an
+        empty list if none of them can be reached.
+
+        One search goes out from the start a step at a time and stops at the
+        first step that reaches any of the cells. The directions are tried
+        from the heading round, so where there is a choice of routes the one
+        that starts straight ahead wins. As for shortest_path(), the current
+        mask is used and the cost list is not touched.
+        """
+        cells = set(cells)
+        if start in cells:
+            return [start]
+        mask = WALL_MASK & self.mask
+        height = self.height
+        offsets = (1, height, -1, -height)
+        walls = self.walls
+        order = [(heading + turn) % DIR_COUNT for turn in range(DIR_COUNT)]
+        # maps the cells reached to the cell they were reached from
+        reached = {start: -1}
+        edge = [start]
+        found = -1
+        while edge and found < 0:
+            next_edge = []
+            for here in edge:
+                walls_here = walls[here]
+                for direction in order:
+                    if walls_here >> direction * 2 & mask:
+                        continue
+                    neighbour = here + offsets[direction]
+                    if neighbour in reached:
+                        continue
+                    reached[neighbour] = here
+                    next_edge.append(neighbour)
+                    if neighbour in cells:
+                        found = neighbour
+                        break
+                if found >= 0:
+                    break
+            edge = next_edge
+        path = []
+        cell = found
+        while cell >= 0:
+            path.append(cell)
+            cell = reached[cell]
+        path.reverse()
+        return path
+
+    def lane_bits(self):
+        """
+        The number of bits given to each cell in a bitboard.
+        It matches the size of an entry in the cost array so that the costs
+        can be copied straight out of a bitboard
+        """
+        return 16 if self.MAX_COST < 65536 else 32
+
+    def edge_boards(self, mask):
+        """
+        Return a list of four bitboards, one for each direction, with a 1 in
+        the lane for every cell that has an exit that way under the given mask.
+        The boards are kept until the walls are re-initialised and are patched
+        by set_wall as walls change so they only get built once.
+        """
+        boards = self.edges.get(mask)
+        if boards is None:
+            boards = [0, 0, 0, 0]
+            lane = self.lane_bits()
+            for cell in range(self.width * self.height):
+                for direction in range(DIR_COUNT):
+                    if self.edge_is_open(cell, direction, mask):
+                        boards[direction] |= 1 << lane * cell
+            self.edges[mask] = boards
+        return boards
+
+    def edge_is_open(self, cell, direction, mask):
+        """
+        True if there is an exit under the mask and a cell on the other side
+        """
+        x, y = self.cell_xy(cell)
+        if direction == DIR_NORTH and y == self.height - 1:
+            return False
+        if direction == DIR_EAST and x == self.width - 1:
+            return False
+        if direction == DIR_SOUTH and y == 0:
+            return False
+        if direction == DIR_WEST and x == 0:
+            return False
+        return (self.walls[cell] >> direction * 2) & mask == 0
+
+    def update_edges(self, cell, direction):
+        """
+        Bring the edge bitboards up to date after a wall has changed.
+        The bits for both sides of the wall are done.
+        """
+        lane = self.lane_bits()
+        opposite = (direction + 2) % DIR_COUNT
+        next = self.neighbour(cell, direction)
+        for mask, boards in self.edges.items():
+            for here, way in ((cell, direction), (next, opposite)):
+                bit = 1 << lane * here
+                if self.edge_is_open(here, way, mask):
+                    boards[way] |= bit
+                else:
+                    boards[way] &= ~bit
+
+    def flood_bitboard(self, target=None):
+        """
+        Flood the maze using bitboards. The result is the same as flood().
+
+        Each cell has a lane of bits in a big integer - 16 bits for most mazes.
+        The lanes of the edge boards hold a 1 where there is an exit and the
+        wavefront has a 1 in every cell reached on the last step. One step of
+        the flood moves the whole wavefront into the neighbouring cells with a
+        shift and an AND for each direction so the number of times round the loop
+        is the length of the longest path, not the number of cells.
+
+        The costs are counted up in the lanes of another big integer. Every
+        step adds 1 to each cell not yet reached so, at the end, each lane holds
+        the number of steps it took to reach that cell. Those lanes are copied
+        straight into the cost array. This assumes that the array is stored
+        little-endian, as it is on the desktop and the Pico.
+        """
+        MAX_COST = self.MAX_COST
+        lane = self.lane_bits()
+        cells = self.width * self.height
+        north, east, south, west = self.edge_boards(WALL_MASK & self.mask)
+        STEP = lane
+        COLUMN_STEP = lane * self.height
+
+        ones = int.from_bytes(array(self.cost_typecode(), [1]) * cells, 'little')
+        targets = self.targets(target)
+        front = 0
+        for cell in targets:
+            front |= 1 << lane * cell
+        unreached = ones ^ front
+        total = unreached
+        steps = 0
+        while True:
+            front = (((front & north) << STEP) | ((front & east) << COLUMN_STEP)
+                     | ((front & south) >> STEP) | ((front & west) >> COLUMN_STEP))
+            front &= unreached
+            if not front:
+                break
+            steps += 1
+            unreached ^= front
+            total += unreached
+        # cells that were never reached have been counted steps + 1 times
+        total += unreached * (MAX_COST - steps - 1)
+        self.cost[:] = array(self.cost_typecode(), total.to_bytes(cells * lane // 8, 'little'))
+
+        self.flood_mask = self.mask
+        self.flood_targets = tuple(targets)
+        self.changed_walls = []
+        if self.gradient is not None:
+            self.build_gradient(self.mask)
         return self.cost[0]
 
-    def flood_for_search(self, target_cell):
+    def cost_typecode(self):
+        """
+        The array typecode for costs, 16 bit unless the maze is very large
+        """
+        return 'H' if self.MAX_COST < 65536 else 'I'
+
+    def repair_flood(self, target=None):
+        """
+        Bring the cost list up to date after some walls have changed
+        without flooding the whole maze.
+
+        This only works if the last flood used the same target and mask
+        and not too many walls have changed since. Otherwise, it just
+        calls flood(). Either way, the result is the same as a full flood.
+
+        The repair is done in two stages. First, any cell whose cost
+        can no longer be supported by an open neighbour with a cost one
+        less is marked as unreachable. That spreads out to the cells that
+        depended on it. Then the marked cells, and the cells either side
+        of the changed walls, are given the best cost they can get from
+        their neighbours and the lower costs are spread out in cost order.
+        New walls raise costs and removed walls lower them so both are
+        needed. Usually only a small part of the maze is touched.
+        """
+        targets = self.targets(target)
+        changed = self.changed_walls
+        if (changed is None or self.flood_mask != self.mask
+                or self.flood_targets != tuple(targets)):
+            return self.flood(target)
+        if not changed:
+            return self.cost[0]
+
+        MASK = WALL_MASK & self.mask
+        MAX_COST = self.MAX_COST
+        offsets = (1, self.height, -1, -self.height)
+        cost = self.cost
+        walls = self.walls
+
+        # the cells either side of every changed wall
+        ends = []
+        for code in changed:
+            cell = code // DIR_COUNT
+            ends.append(cell)
+            ends.append(self.neighbour(cell, code % DIR_COUNT))
+
+        # raise: remove costs that have lost their support
+        invalid = []
+        stack = list(ends)
+        while stack:
+            here = stack.pop()
+            here_cost = cost[here]
+            if here_cost == MAX_COST or here_cost == 0:
+                continue
+            walls_here = walls[here]
+            supported = False
+            for direction in range(DIR_COUNT):
+                if (walls_here >> direction * 2) & MASK == 0:
+                    if cost[here + offsets[direction]] == here_cost - 1:
+                        supported = True
+                        break
+            if supported:
+                continue
+            cost[here] = MAX_COST
+            invalid.append(here)
+            for direction in range(DIR_COUNT):
+                if (walls_here >> direction * 2) & MASK == 0:
+                    neighbour = here + offsets[direction]
+                    if cost[neighbour] == here_cost + 1:
+                        stack.append(neighbour)
+
+        # lower: find the best cost for each affected cell ...
+        seeds = []
+        for here in invalid + ends:
+            walls_here = walls[here]
+            best = cost[here]
+            for direction in range(DIR_COUNT):
+                if (walls_here >> direction * 2) & MASK == 0:
+                    neighbour_cost = cost[here + offsets[direction]] + 1
+                    if neighbour_cost < best:
+                        best = neighbour_cost
+            if best < cost[here]:
+                cost[here] = best
+                seeds.append((best, here))
+        seeds.sort()
+
+        # ... and spread them out in cost order, merging the sorted seeds
+        # with the queue of cells they update. Stale entries are skipped.
+        queue = []
+        head = 0
+        index = 0
+        while index < len(seeds) or head < len(queue):
+            if head < len(queue) and (index == len(seeds) or queue[head][0] <= seeds[index][0]):
+                here_cost, here = queue[head]
+                head += 1
+            else:
+                here_cost, here = seeds[index]
+                index += 1
+            if cost[here] != here_cost:
+                continue
+            walls_here = walls[here]
+            next_cost = here_cost + 1
+            for direction in range(DIR_COUNT):
+                if (walls_here >> direction * 2) & MASK == 0:
+                    neighbour = here + offsets[direction]
+                    if cost[neighbour] > next_cost:
+                        cost[neighbour] = next_cost
+                        queue.append((next_cost, neighbour))
+
+        self.changed_walls = []
+        if self.gradient is not None:
+            # any cell next to a changed cell or wall may need a new direction
+            changed = set(ends)
+            changed.update(invalid)
+            for _, here in seeds:
+                changed.add(here)
+            for _, here in queue:
+                changed.add(here)
+            around = set()
+            for here in changed:
+                around.add(here)
+                for offset in offsets:
+                    around.add(here + offset)
+            cells = self.width * self.height
+            self.build_gradient(self.mask, [c for c in around if 0 <= c < cells])
+        return cost[0]
+
+    def update_flood(self, target=None):
+        """
+        Make sure the cost list is right for the target and current mask.
+
+        If the walls and goals have not changed since a flood for the same
+        target and mask, the costs are copied back from the flood cache.
+        Otherwise, the costs are repaired if in incremental mode or the maze
+        is flooded and the result goes into the cache.
+        """
+        log = self.flood_log
+        if log is not None:
+            start = ticks_us()
+            count = log.count
+        targets = self.targets(target)
+        if self.cache_size and self.cached_flood(targets):
+            if log is not None:
+                log.record(LOG_CACHE, 0, 0, 0, ticks_diff(ticks_us(), start), self.mask, targets)
+            return self.cost[0]
+        if self.incremental:
+            cost = self.repair_flood(target)
+            # a repair that turned into a full flood has already been logged
+            if log is not None and log.count == count:
+                log.record(LOG_REPAIR, 0, 0, 0, ticks_diff(ticks_us(), start), self.mask, targets)
+        else:
+            cost = self.flood(target)
+        if self.cache_size:
+            self.cache_flood(targets)
+        return cost
+
+    def set_cache_size(self, size):
+        """
+        Set the number of cost lists kept by the flood cache.
+        Each one takes as much memory as the cost list, and the gradient
+        table if that is turned on. Zero turns the cache off.
+        """
+        self.cache_size = size
+        del self.flood_cache[size:]
+
+    def cached_flood(self, targets):
+        """
+        Look in the flood cache for costs that match the current walls,
+        goals, mask and the targets. If they are there, copy them into the
+        cost list and return True.
+        The cache is kept in order with the most recently used at the end.
+        """
+        cache = self.flood_cache
+        targets = tuple(targets)
+        for i in range(len(cache)):
+            entry = cache[i]
+            if entry[0] == self.version and entry[1] == self.mask and entry[2] == targets:
+                self.cost[:] = entry[3]
+                if self.gradient is not None:
+                    if entry[4] is None:
+                        self.build_gradient(self.mask)
+                    else:
+                        self.gradient[:] = entry[4]
+                if i != len(cache) - 1:
+                    cache.append(cache.pop(i))
+                self.flood_mask = self.mask
+                self.flood_targets = targets
+                self.changed_walls = []
+                return True
+        return False
+
+    def cache_flood(self, targets):
+        """
+        Put a copy of the cost list in the flood cache, throwing out the
+        least recently used entry if the cache is full. Its buffers are
+        reused so that a full cache does not allocate more memory.
+        """
+        cache = self.flood_cache
+        cost = None
+        gradient = None
+        if len(cache) >= self.cache_size:
+            _, _, _, cost, gradient = cache.pop(0)
+            if len(cost) != len(self.cost):
+                cost = None
+        if cost is None:
+            cost = array(self.cost_typecode(), self.cost)
+        else:
+            cost[:] = self.cost
+        if self.gradient is None:
+            gradient = None
+        elif gradient is None or len(gradient) != len(self.gradient):
+            gradient = bytearray(self.gradient)
+        else:
+            gradient[:] = self.gradient
+        cache.append((self.version, self.mask, tuple(targets), cost, gradient))
+
+    def flood_for_search(self, target=None):
         mask = self.mask
         self.mask = OPEN_MAZE_MASK
-        cost = self.flood(target_cell)
+        cost = self.update_flood(target)
         self.mask = mask
         return cost
 
-    def flood_for_speed_run(self, target_cell):
+    def flood_for_speed_run(self, target=None):
         mask = self.mask
         self.mask = CLOSED_MAZE_MASK
-        cost = self.flood(target_cell)
+        cost = self.update_flood(target)
         self.mask = mask
         return cost
 
-    def speed_run_possible(self):
-        searchrun_cost = self.flood_for_search(self.get_goal())
-        speedrun__cost = self.flood_for_speed_run(self.get_goal())
-        return searchrun_cost == speedrun__cost
+    @micropython.native
+    def flood_dual(self, target=None, stop_early=False):
+        """
+        Flood the maze for search and for a speed run at the same time.
+        The speed run (closed maze) costs go into the cost list, as if
+        flood_for_speed_run() had been called, and the search (open maze)
+        costs go into the search_cost list. Returns both costs for the start
+        cell as a tuple (search cost, speed run cost).
+
+        The two floods share one queue. It is processed one level of cost
+        at a time and, for each cell, each flood that reached the cell at
+        the current level moves on to its neighbours. A closed maze exit is
+        always an open maze exit as well so the closed maze cost of a cell is
+        never less than its open maze cost. A cell goes into the queue again
+        only when its closed cost turns out to be larger.
+
+        With stop_early=True, the flood stops as soon as the start cell has an
+        open maze cost but no closed maze cost at the same level. The costs
+        must then be different and the speed run cost returned is MAX_COST.
+        The cost lists are left unfinished in that case and costs_complete()
+        returns False until the next full flood.
+        """
+        OPEN_NORTH = OPEN_MAZE_MASK << DIR_NORTH * 2
+        OPEN_EAST = OPEN_MAZE_MASK << DIR_EAST * 2
+        OPEN_SOUTH = OPEN_MAZE_MASK << DIR_SOUTH * 2
+        OPEN_WEST = OPEN_MAZE_MASK << DIR_WEST * 2
+        CLOSED_NORTH = CLOSED_MAZE_MASK << DIR_NORTH * 2
+        CLOSED_EAST = CLOSED_MAZE_MASK << DIR_EAST * 2
+        CLOSED_SOUTH = CLOSED_MAZE_MASK << DIR_SOUTH * 2
+        CLOSED_WEST = CLOSED_MAZE_MASK << DIR_WEST * 2
+        MAX_COST = self.MAX_COST
+
+        height = self.height
+        walls = self.walls
+        open_cost = self.search_cost
+        closed_cost = self.cost
+        open_cost[:] = self.clear_cost
+        closed_cost[:] = self.clear_cost
+        queue = self.queue
+        head = 0
+        tail = 0
+        targets = self.targets(target)
+        for cell in targets:
+            if open_cost[cell] != 0:
+                open_cost[cell] = 0
+                closed_cost[cell] = 0
+                queue[tail] = cell
+                tail += 1
+        level = 0
+        level_end = tail
+        while head < tail:
+            here = queue[head]
+            head += 1
+            walls_here = walls[here]
+            next_cost = level + 1
+
+            if open_cost[here] == level:
+                if walls_here & OPEN_NORTH == 0:
+                    neighbour = here + 1
+                    if open_cost[neighbour] == MAX_COST:
+                        open_cost[neighbour] = next_cost
+                        queue[tail] = neighbour
+                        tail += 1
+                if walls_here & OPEN_EAST == 0:
+                    neighbour = here + height
+                    if open_cost[neighbour] == MAX_COST:
+                        open_cost[neighbour] = next_cost
+                        queue[tail] = neighbour
+                        tail += 1
+                if walls_here & OPEN_SOUTH == 0:
+                    neighbour = here - 1
+                    if open_cost[neighbour] == MAX_COST:
+                        open_cost[neighbour] = next_cost
+                        queue[tail] = neighbour
+                        tail += 1
+                if walls_here & OPEN_WEST == 0:
+                    neighbour = here - height
+                    if open_cost[neighbour] == MAX_COST:
+                        open_cost[neighbour] = next_cost
+                        queue[tail] = neighbour
+                        tail += 1
+
+            # a neighbour with the same open cost is already in the queue
+            if closed_cost[here] == level:
+                if walls_here & CLOSED_NORTH == 0:
+                    neighbour = here + 1
+                    if closed_cost[neighbour] == MAX_COST:
+                        closed_cost[neighbour] = next_cost
+                        if open_cost[neighbour] != next_cost:
+                            queue[tail] = neighbour
+                            tail += 1
+                if walls_here & CLOSED_EAST == 0:
+                    neighbour = here + height
+                    if closed_cost[neighbour] == MAX_COST:
+                        closed_cost[neighbour] = next_cost
+                        if open_cost[neighbour] != next_cost:
+                            queue[tail] = neighbour
+                            tail += 1
+                if walls_here & CLOSED_SOUTH == 0:
+                    neighbour = here - 1
+                    if closed_cost[neighbour] == MAX_COST:
+                        closed_cost[neighbour] = next_cost
+                        if open_cost[neighbour] != next_cost:
+                            queue[tail] = neighbour
+                            tail += 1
+                if walls_here & CLOSED_WEST == 0:
+                    neighbour = here - height
+                    if closed_cost[neighbour] == MAX_COST:
+                        closed_cost[neighbour] = next_cost
+                        if open_cost[neighbour] != next_cost:
+                            queue[tail] = neighbour
+                            tail += 1
+
+            if head == level_end:
+                # every cell with a cost up to next_cost is now known
+                if stop_early and open_cost[0] <= next_cost and closed_cost[0] > next_cost:
+                    self.flood_targets = None
+                    return open_cost[0], MAX_COST
+                level = next_cost
+                level_end = tail
+
+        self.flood_mask = CLOSED_MAZE_MASK
+        self.flood_targets = tuple(targets)
+        self.changed_walls = []
+        if self.gradient is not None:
+            self.build_gradient(CLOSED_MAZE_MASK)
+        return open_cost[0], closed_cost[0]
+
+    def plan_speed_run(self, start=0, heading=DIR_NORTH, target=None, costs=None):
+        """
+        Find the fastest safe route from the start cell, facing in the given
+        direction, to the target or the goal set. Only known exits are used, as
+        with the CLOSED_MAZE_MASK, whatever the current mask is.
+
+        The time for a route comes from a RunCosts model rather than just
+        counting cells so a route with long straights and few turns can beat
+        a shorter one with lots of turns.
+
+        This is Dijkstra's method over (cell, heading) states. From each state,
+        the mouse can turn, or run straight for any number of cells. Because all
+        the times are small integers, the states waiting to be looked at are
+        kept in a ring of buckets, one per time value, rather than a heap.
+
+        Returns a tuple (time, cells) where cells is the list of cells on the
+        route, including the start and end. Returns None if there is no safe route.
+        """
+        if costs is None:
+            costs = RunCosts()
+        height = self.height
+        cells = self.width * height
+        walls = self.walls
+        offsets = (1, height, -1, -height)
+        runs = [costs.straight(n) for n in range(self.size + 1)]
+        turns = (0, costs.turn, costs.around, costs.turn)
+        longest = max(max(runs), costs.turn, costs.around)
+        is_goal = bytearray(cells)
+        for cell in self.targets(target):
+            is_goal[cell] = 1
+
+        NOT_SEEN = 0xFFFFFFFF
+        time_to = array('I', [NOT_SEEN]) * (cells * DIR_COUNT)
+        came_from = array('i', [-1]) * (cells * DIR_COUNT)
+        buckets = [[] for _ in range(longest + 1)]
+        state = start * DIR_COUNT + heading
+        time_to[state] = 0
+        buckets[0].append(state)
+        waiting = 1
+        time = 0
+        while waiting:
+            bucket = buckets[time % (longest + 1)]
+            while bucket:
+                state = bucket.pop()
+                waiting -= 1
+                if time_to[state] != time:
+                    continue
+                here = state // DIR_COUNT
+                heading = state % DIR_COUNT
+                if is_goal[here]:
+                    route = [here]
+                    while came_from[state] >= 0:
+                        state = came_from[state]
+                        cell = state // DIR_COUNT
+                        # fill in the cells along a straight
+                        while cell != route[-1]:
+                            route.append(route[-1] - offsets[state % DIR_COUNT])
+                    route.reverse()
+                    return time, route
+                # turn on the spot
+                for turn in range(1, DIR_COUNT):
+                    next_state = here * DIR_COUNT + (heading + turn) % DIR_COUNT
+                    next_time = time + turns[turn]
+                    if next_time < time_to[next_state]:
+                        time_to[next_state] = next_time
+                        came_from[next_state] = state
+                        buckets[next_time % (longest + 1)].append(next_state)
+                        waiting += 1
+                # run straight ahead through known exits
+                cell = here
+                run = 0
+                while (walls[cell] >> heading * 2) & CLOSED_MAZE_MASK == 0:
+                    cell += offsets[heading]
+                    run += 1
+                    next_state = cell * DIR_COUNT + heading
+                    next_time = time + runs[run]
+                    if next_time < time_to[next_state]:
+                        time_to[next_state] = next_time
+                        came_from[next_state] = state
+                        buckets[next_time % (longest + 1)].append(next_state)
+                        waiting += 1
+            time += 1
+        return None
+
+    def speed_run_possible(self, target=None):
+        """
+        Returns True if the search and speed run costs to the target are
+        the same. That is, the shortest route is known to be safe.
+        Both are found in a single flood that gives up as soon as it is clear
+        that the costs are different. When it returns True, the cost list
+        is ready for a speed run.
+        When it returns False, the flood stopped part way so both cost lists
+        are unfinished and costs_complete() is False. Flood for search before
+        using the costs to find the way.
+        """
+        searchrun_cost, speedrun_cost = self.flood_dual(target, stop_early=True)
+        return searchrun_cost == speedrun_cost
+
+    def costs_complete(self):
+        """
+        True if the cost list holds the result of a complete flood. It is
+        False before the first flood, after flood_to_cell() and after
+        flood_dual() gives up early, as it does when speed_run_possible()
+        returns False. The costs of cells far from the target are then
+        still MAX_COST, or too small, so they are no good for finding a way.
+        """
+        return self.flood_targets is not None
+
+    def flood_into(self, cost, target=None):
+        """
+        Flood the open maze into another cost list. The cost list, and
+        everything that the gradient, the cache and the incremental flood
+        know about the last flood, are left as they were.
+        """
+        saved = (self.cost, self.mask, self.gradient, self.flood_mask,
+                 self.flood_targets, self.changed_walls)
+        self.cost = cost
+        self.mask = OPEN_MAZE_MASK
+        self.gradient = None
+        self.flood(target)
+        (self.cost, self.mask, self.gradient, self.flood_mask,
+         self.flood_targets, self.changed_walls) = saved
+        self.explore_floods += 1
+
+    def frontier_valid(self, targets):
+        """
+        True if the shortest routes found by the last frontier_cells() for
+        the targets are still the shortest routes.
+        In the open maze only walls that are present, or virtual, are in the
+        way. If none of those have gone, no route can have got shorter. If none
+        of the new ones are between two cells that follow on from each other
+        along a shortest route, all of those routes are still there. Then the
+        routes have not changed at all and there is no need to flood again.
+        """
+        if self.explore_walls is None or targets != self.explore_targets:
+            return False
+        if self.version == self.explore_version:
+            return True
+        cells = self.width * self.height
+        closed = int.from_bytes(bytes([0x55]) * cells, 'little')
+        before = int.from_bytes(self.explore_walls, 'little') & closed
+        now = int.from_bytes(self.walls, 'little') & closed
+        if before & ~now:
+            return False
+        added = (now & ~before).to_bytes(cells, 'little')
+        height = self.height
+        offsets = (1, height, -1, -height)
+        from_start = self.explore_start_cost
+        to_target = self.explore_cost
+        for cell in self.explore_route:
+            if added[cell] == 0:
+                continue
+            for direction in range(DIR_COUNT):
+                if added[cell] >> direction * 2 & 1:
+                    next = cell + offsets[direction]
+                    if 0 <= next < cells and (from_start[next] == from_start[cell] + 1
+                            and to_target[next] == to_target[cell] - 1):
+                        return False
+        return True
+
+    def frontier_cells(self, target=None):
+        """
+        Return a list of the cells that are on one of the shortest routes
+        from the start to the target, or the goal set, in the open maze but
+        have not been visited. Until all of these have been visited, the
+        speed run cannot be known to be the shortest, so they are the cells
+        worth exploring. An empty list means that there is nothing left to
+        find out or that there is no route at all.
+
+        It floods from the target and from the start into cost lists of
+        its own, so the cost list and search_cost are not touched. A cell
+        is on a shortest route if its two costs add up to the cost of the
+        whole route. The routes are kept and only worked out again when a
+        wall that has been found since might change them, as decided by
+        frontier_valid(). explore_floods counts the floods that were needed.
+        """
+        targets = tuple(self.targets(target))
+        if not self.frontier_valid(targets):
+            if self.explore_cost is None:
+                self.explore_cost = array(self.cost_typecode(), self.clear_cost)
+                self.explore_start_cost = array(self.cost_typecode(), self.clear_cost)
+            to_target = self.explore_cost
+            from_start = self.explore_start_cost
+            self.flood_into(to_target, targets)
+            self.flood_into(from_start, 0)
+            total = to_target[0]
+            route = []
+            if total != self.MAX_COST:
+                for cell in range(self.width * self.height):
+                    if to_target[cell] + from_start[cell] == total:
+                        route.append(cell)
+            self.explore_route = route
+            self.explore_targets = targets
+            self.explore_walls = bytes(self.walls)
+            self.explore_version = self.version
+        return [cell for cell in self.explore_route if not self.cell_is_visited(cell)]
+
+    def exploration_route(self, cell, heading=DIR_NORTH, target=None):
+        """
+        Choose where to explore next from the given cell. Returns the
+        shortest route in the open maze, as a list of cells starting with
+        this one, to the nearest of the frontier_cells() for the target.
+        If there are none left, or they cannot be reached, the list is
+        empty and it is time to head for the target.
+        Apart from any floods frontier_cells() needs, there is no flood.
+        """
+        candidates = [candidate for candidate in self.frontier_cells(target) if candidate != cell]
+        if not candidates:
+            return []
+        mask = self.mask
+        self.mask = OPEN_MAZE_MASK
+        route = self.path_to_nearest(cell, candidates, heading)
+        self.mask = mask
+        return route
+
+
+class LiveView:
+    """
+    Keep a maze drawn on an ANSI terminal, such as a serial console.
+    The first call to frame() returns the whole maze. After that, it only
+    returns the parts of the picture that have changed, each one with an
+    ANSI escape to move the cursor there first. Redrawing after each flood
+    then sends a few bytes rather than the whole maze.
+
+      live = LiveView(maze, VIEW_COSTS)
+      print(live.frame(), end="")
+    """
+
+    def __init__(self, maze, view=VIEW_COSTS, row=1, column=1):
+        self.maze = maze
+        self.view = view
+        self.row = row  # screen position of the top left corner, from 1
+        self.column = column
+        self.rows = None
+
+    def reset(self):
+        """
+        Forget what is on the screen so that the next frame is complete
+        """
+        self.rows = None
+
+    def frame(self):
+        """
+        Return the text to send to the terminal to bring it up to date
+        """
+        rows = self.maze.get_maze_rows(self.view)
+        old_rows = self.rows
+        self.rows = rows
+        if old_rows is None or len(old_rows) != len(rows):
+            return "".join(["\x1b[%d;%dH%s" % (self.row + i, self.column, row) for i, row in enumerate(rows)])
+        out = []
+        for i, row in enumerate(rows):
+            old_row = old_rows[i]
+            if row == old_row:
+                continue
+            if len(row) != len(old_row):
+                out.append("\x1b[%d;%dH%s\x1b[K" % (self.row + i, self.column, row))
+                continue
+            # group the changes into runs, joining runs that are closer together
+            # than the length of the escape needed to jump between them
+            start = None
+            end = 0
+            for j in range(len(row)):
+                if row[j] != old_row[j]:
+                    if start is None:
+                        start = j
+                    elif j - end > 6:
+                        out.append("\x1b[%d;%dH%s" % (self.row + i, self.column + start, row[start:end]))
+                        start = j
+                    end = j + 1
+            out.append("\x1b[%d;%dH%s" % (self.row + i, self.column + start, row[start:end]))
+        return "".join(out)
 
 
 if __name__ == "__main__":
@@ -435,6 +2219,9 @@ if __name__ == "__main__":
     from maze_files import *
     import os
     import sys
+    import gc
+    if sys.implementation.name != 'micropython':
+        import tracemalloc
 
     def millis():
         if sys.implementation.name == 'micropython':
@@ -450,8 +2237,54 @@ if __name__ == "__main__":
         else:
             return 1000
 
+    def heap_used():
+        """
+        Bytes currently allocated on the heap. Collect the garbage first so
+        that the difference between two calls is what is still in use
+        """
+        gc.collect()
+        if sys.implementation.name == 'micropython':
+            return gc.mem_alloc()
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            return tracemalloc.get_traced_memory()[0]
+
+    def stop_tracing():
+        """
+        Stop tracing the heap on the desktop so that it does not slow down
+        the next timing. heap_used() starts it again when needed.
+        """
+        if sys.implementation.name != 'micropython':
+            tracemalloc.stop()
+
+    def heap_churn(function, count):
+        """
+        Bytes allocated while calling the function count times.
+        On the desktop this is the peak traced memory. MicroPython cannot
+        trace allocations so the collector is turned off while the function
+        runs and the growth of the heap is measured instead.
+        """
+        if sys.implementation.name == 'micropython':
+            gc.collect()
+            gc.disable()
+            before = gc.mem_alloc()
+            for _ in range(count):
+                function()
+            used = gc.mem_alloc() - before
+            gc.enable()
+            return used
+        else:
+            before = heap_used()
+            tracemalloc.reset_peak()
+            for _ in range(count):
+                function()
+            return tracemalloc.get_traced_memory()[1] - before
+
     # Example usage
     maze = Maze()
+    # time the flood itself, not the flood cache
+    maze.set_cache_size(0)
     # set up a standard maze that is mostly empty
     maze.init_walls()
     maze.update_wall(maze.cell_id(7, 7), DIR_WEST, WALL_PRESENT)
@@ -479,6 +2312,68 @@ if __name__ == "__main__":
     print("Flood distance correct: ", maze.cost[0] == 20)
     print(f"{sys.implementation.name} - maze: Execution Time for {iterations()} iterations: {t:} milliseconds")
 
+    # the same again with the bitboard flood
+    maze.set_engine(FLOOD_BITBOARD)
+    start_time = millis()
+    for _ in range(iterations()):
+        distances = maze.flood_for_search(target)
+    end_time = millis()
+    t = end_time - start_time
+    maze.set_engine(FLOOD_QUEUE)
+    print(f"{sys.implementation.name} - maze: Bitboard flood Execution Time for {iterations()} iterations: {t:} milliseconds")
+
+    # now see how much memory the maze needs and how much a flood allocates
+    heap_before = heap_used()
+    other_maze = Maze()
+    print(f"{sys.implementation.name} - maze: heap used by a Maze object: {heap_used() - heap_before} bytes")
+    churn = heap_churn(lambda: maze.flood_for_search(target), 10)
+    print(f"{sys.implementation.name} - maze: heap allocated by 10 floods: {churn} bytes")
+    # compare with the old layout, which kept the walls, costs and queue in
+    # lists and made new cost and queue lists for every flood
+    cells = maze.width * maze.height
+    heap_before = heap_used()
+    old_buffers = ([0] * cells, [0] * cells, [0] * cells)
+    print(f"{sys.implementation.name} - maze: heap used by the same buffers as lists, as before: {heap_used() - heap_before} bytes")
+    del old_buffers
+    churn = heap_churn(lambda: ([maze.MAX_COST] * cells, [0] * cells), 10)
+    print(f"{sys.implementation.name} - maze: heap allocated by 10 floods making new lists, as before: {churn} bytes")
+
+    # how the flood time and memory grow with the size of the maze
+    # the time per cell should stay about the same and floods should allocate nothing
+    if sys.implementation.name == 'micropython':
+        shapes = ((16, 16), (32, 32), (64, 32))
+    else:
+        shapes = ((16, 16), (32, 32), (64, 64), (128, 128), (256, 256), (512, 256))
+    stop_tracing()
+    print("  width height  cells   engine   ms/flood  ns/cell   maze bytes  flood bytes")
+    for width, height in shapes:
+        # time first as tracing the heap slows everything down
+        big_maze = Maze(width, height)
+        big_maze.set_cache_size(0)
+        cells = width * height
+        count = max(1, iterations() * 256 // cells)
+        times = []
+        for engine in (FLOOD_QUEUE, FLOOD_BITBOARD):
+            big_maze.set_engine(engine)
+            big_maze.flood_for_search(0)
+            start_time = millis()
+            for _ in range(count):
+                big_maze.flood_for_search(0)
+            times.append((millis() - start_time) / count)
+        del big_maze
+        heap_before = heap_used()
+        big_maze = Maze(width, height)
+        maze_bytes = heap_used() - heap_before
+        big_maze.set_cache_size(0)
+        for engine, name in ((FLOOD_QUEUE, 'queue'), (FLOOD_BITBOARD, 'bitboard')):
+            big_maze.set_engine(engine)
+            big_maze.flood_for_search(0)
+            churn = heap_churn(lambda: big_maze.flood_for_search(0), 1)
+            t = times[engine]
+            print(f"{width:>7}{height:>7}{cells:>7}  {name:>9}{t:>10.2f}{t * 1e6 / cells:>9.0f}{maze_bytes:>13}{churn:>13}")
+        del big_maze
+        stop_tracing()
+
     maze.init_walls_from_string(all_japan_2007)
     maze.flood(target)
     maze_str = maze.get_maze_string(VIEW_COSTS)
@@ -0,0 +1,134 @@
+# maze_async.py
+# Maze code for MicroPython
+# Copyright (c) 2024 Peter Harrison
+# Contributions from Paul Busby and David Hannaford
+# Released under the MIT License (https://opensource.org/licenses/MIT)
+
+"""
+ An asyncio front end for a Maze that is being fed walls as they are seen.
+
+ When walls arrive one at a time from a sensor task, a simulator or a
+ telemetry link, updating the maze and flooding again for every one of them
+ means flooding several times for each cell. A MazePipeline collects the
+ walls as they arrive and only applies them and floods when it needs to:
+
+   - at most once every interval_ms while walls keep coming in, and
+   - whenever a direction is asked for and the costs are out of date.
+
+ Walls that come in together are put into the maze with one call to
+ update_walls() and, if none of them were new, there is no flood at all.
+
+ The Maze itself stays as it is, synchronous and usable on its own.
+ On MicroPython the uasyncio module is used if there is no asyncio.
+
+   pipeline = MazePipeline(maze, interval_ms=20)
+   asyncio.create_task(pipeline.run())
+   asyncio.create_task(pipeline.ingest(wall_events()))
+   ...
+   direction = await pipeline.next_direction(cell, heading)
+"""
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+from maze import *
+
+
+class MazePipeline:
+    """
+    Collects wall events for a maze and keeps its search flood up to date
+    without flooding for every event. A wall event is a tuple of
+    (cell, direction, state), the same as one entry for update_walls().
+    target is the target for the flood, the goal set by default.
+    """
+
+    def __init__(self, maze, interval_ms=20, target=None):
+        self.maze = maze
+        self.interval_ms = interval_ms
+        self.target = target
+        self.pending = []
+        self.flooded_version = -1
+        self.event = asyncio.Event()
+        self.running = False
+        # counts to see how much work was saved
+        self.events = 0
+        self.floods = 0
+
+    def add(self, cell, direction, state):
+        """
+        Queue up one wall event. It is not put into the maze until the
+        next refresh so this is cheap enough to call from anywhere.
+        """
+        self.pending.append((cell, direction, state))
+        self.events += 1
+        self.event.set()
+
+    async def ingest(self, source):
+        """
+        Read wall events from an async iterator until it runs out
+        """
+        async for cell, direction, state in source:
+            self.add(cell, direction, state)
+
+    def set_target(self, target=None):
+        """
+        Change the target of the flood. The next refresh will flood for it.
+        """
+        self.target = target
+        self.flooded_version = -1
+
+    def stale(self):
+        """
+        True if there are walls waiting or the costs are not for the current maze
+        """
+        return len(self.pending) > 0 or self.flooded_version != self.maze.version
+
+    def refresh(self):
+        """
+        Put all the waiting walls into the maze and flood if anything has
+        changed since the last flood. Returns True if it flooded.
+        """
+        maze = self.maze
+        if self.pending:
+            maze.update_walls(self.pending)
+            self.pending = []
+        if self.flooded_version == maze.version:
+            return False
+        maze.flood_for_search(self.target)
+        self.flooded_version = maze.version
+        self.floods += 1
+        return True
+
+    async def run(self):
+        """
+        Refresh the maze in the background, no more than once every interval_ms.
+        After the first wall of a burst arrives it waits for the interval so the
+        rest of the burst can be collected before the flood. Runs until stop().
+        """
+        self.running = True
+        while self.running:
+            await self.event.wait()
+            self.event.clear()
+            if not self.running:
+                break
+            await asyncio.sleep(self.interval_ms / 1000)
+            self.refresh()
+
+    def stop(self):
+        self.running = False
+        self.event.set()
+
+    async def next_direction(self, cell, heading=DIR_NORTH):
+        """
+        The direction to go from cell to get closer to the target, testing
+        ahead first. If there are walls waiting, or the maze has changed, it
+        floods first so the answer is always based on everything seen so far.
+        """
+        if self.stale():
+            self.refresh()
+        else:
+            # let the other tasks run even if there is nothing to do
+            await asyncio.sleep(0)
+        return self.maze.direction_to_smallest(cell, heading)
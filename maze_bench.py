@@ -0,0 +1,282 @@
+# maze_bench.py
+# Maze code for MicroPython
+# Copyright (c) 2024 Peter Harrison
+# Contributions from Paul Busby and David Hannaford
+# Released under the MIT License (https://opensource.org/licenses/MIT)
+
+"""
+ Compare the flood engines over a fixed set of mazes and sizes.
+
+ Each engine floods each maze many times. Every flood is timed on its own and
+ the results show the median and 95th percentile time, the number of cells
+ given a cost per second and the most memory allocated by a single flood.
+ The incremental engine only repairs the costs that change so its rate is how
+ fast it keeps every cell up to date, not how many it actually looked at.
+
+ The medians can be saved as a baseline in a JSON file. A later run can be
+ checked against the baseline and exits with an error if any engine has got
+ slower by more than the tolerance, so it can be used in a test script.
+
+ It runs on the desktop and on MicroPython. Options are
+
+   --engines queue,bitboard    engines to run, all of them by default
+   --sizes 16,32               sizes of generated mazes, 16,32,64 by default
+   --repeat 50                 floods timed for each engine and maze
+   --save baseline.json        save the medians as a baseline
+   --baseline baseline.json    compare the medians with a saved baseline
+   --tolerance 0.25            how much slower counts as a regression
+
+ For example
+
+   python maze_bench.py --sizes 16,32 --save baseline.json
+   python maze_bench.py --sizes 16,32 --baseline baseline.json
+"""
+
+import gc
+import json
+import sys
+
+from maze import *
+import maze_dh
+import maze_files
+import maze_gen
+
+if sys.implementation.name == 'micropython':
+    tracemalloc = None
+else:
+    import tracemalloc
+
+
+# Each engine is set up for a maze and returns two functions. The first does
+# one flood and the second counts the cells the flood gave a cost to.
+
+def queue_engine(maze):
+    maze.set_engine(FLOOD_QUEUE)
+    goals = maze.get_goals()
+    return (lambda: maze.flood(goals)), (lambda: reached(maze.cost, maze.MAX_COST))
+
+
+def bitboard_engine(maze):
+    maze.set_engine(FLOOD_BITBOARD)
+    goals = maze.get_goals()
+    return (lambda: maze.flood(goals)), (lambda: reached(maze.cost, maze.MAX_COST))
+
+
+def dual_engine(maze):
+    maze.set_engine(FLOOD_QUEUE)
+    goals = maze.get_goals()
+    return ((lambda: maze.flood_dual(goals)),
+            (lambda: reached(maze.cost, maze.MAX_COST) + reached(maze.search_cost, maze.MAX_COST)))
+
+
+def cell_engine(maze):
+    maze.set_engine(FLOOD_QUEUE)
+    goals = maze.get_goals()
+    return (lambda: maze.flood_to_cell(0, goals)), (lambda: reached(maze.cost, maze.MAX_COST))
+
+
+def incremental_engine(maze):
+    """
+    The search flood, repaired after one wall changes each time. The wall to
+    the North of the start cell is closed and opened in turn as that changes
+    the cost of every cell on the way to the goal.
+    """
+    maze.set_engine(FLOOD_QUEUE)
+    maze.set_incremental(True)
+    maze.set_cache_size(0)
+    goals = maze.get_goals()
+    maze.flood_for_search(goals)
+    state = [WALL_ABSENT]
+
+    def run():
+        state[0] ^= WALL_PRESENT
+        maze.set_wall(0, DIR_NORTH, state[0])
+        maze.flood_for_search(goals)
+
+    return run, (lambda: reached(maze.cost, maze.MAX_COST))
+
+
+def dh_engine(maze):
+    """
+    The inline flood in maze_dh.py, from the first goal cell to the start.
+    Its walls have the same bits as a .maz file but the cells go along the rows.
+    """
+    maze_dh.setsize(maze.width, maze.height)
+    codes = maze.get_maz()
+    for x in range(maze.width):
+        for y in range(maze.height):
+            maze_dh.walls[y * maze.width + x] = codes[maze.cell_id(x, y)]
+    x, y = maze.cell_xy(maze.get_goal())
+    goal = y * maze.width + x
+    return ((lambda: maze_dh.floodmaze(goal, maze_dh.START)),
+            (lambda: reached(maze_dh.maze, maze_dh.numcells)))
+
+
+ENGINES = {
+    'queue': queue_engine,
+    'bitboard': bitboard_engine,
+    'dual': dual_engine,
+    'cell': cell_engine,
+    'incremental': incremental_engine,
+    'maze_dh': dh_engine,
+}
+
+
+def reached(cost, max_cost):
+    """
+    The number of cells with a cost
+    """
+    count = 0
+    for value in cost:
+        if value < max_cost:
+            count += 1
+    return count
+
+
+def maze_set(sizes):
+    """
+    The mazes to run, as a list of (name, maze). The two mazes from
+    maze_files.py and, for each size, one of each kind from maze_gen.py.
+    The seeds are fixed so the set is the same every time.
+    """
+    mazes = []
+    for name in ('empty_classic_maze', 'all_japan_2007'):
+        maze = Maze()
+        maze.init_walls_from_string(getattr(maze_files, name))
+        mazes.append((name, maze))
+    for size in sizes:
+        for kind in ('perfect', 'competition', 'loopy', 'corridor'):
+            maze = Maze(size)
+            maze_gen.GENERATORS[kind](maze, size)
+            mazes.append((f"{kind}_{size}", maze))
+    return mazes
+
+
+def percentile(values, fraction):
+    """
+    The value a fraction of the way along the sorted list
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def peak_memory(run):
+    """
+    The most heap allocated while running one flood, in bytes. On MicroPython
+    the collector is stopped and the growth of the heap is measured instead.
+    """
+    gc.collect()
+    if tracemalloc is None:
+        gc.disable()
+        before = gc.mem_alloc()
+        run()
+        used = gc.mem_alloc() - before
+        gc.enable()
+        return used
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    run()
+    used = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return used
+
+
+def bench(engine, maze, repeat):
+    """
+    Time the engine on the maze and return the results as a dictionary
+    """
+    run, count = ENGINES[engine](maze)
+    run()
+    times = []
+    for _ in range(repeat):
+        start = ticks_us()
+        run()
+        times.append(ticks_diff(ticks_us(), start))
+    times.sort()
+    median = percentile(times, 0.5)
+    cells = count()
+    return {
+        'median_us': median,
+        'p95_us': percentile(times, 0.95),
+        'cells': cells,
+        'cells_per_s': int(cells * 1000000 / median) if median else 0,
+        'peak_bytes': peak_memory(run),
+    }
+
+
+def run_benchmarks(engines=None, sizes=(16, 32, 64), repeat=50, report=print):
+    """
+    Run every engine on every maze. Returns a dictionary of results
+    keyed on 'engine/maze'. Each result is printed as it is finished.
+    """
+    if engines is None:
+        engines = list(ENGINES)
+    results = {}
+    report(f"{'engine':12}{'maze':22}{'median us':>10}{'p95 us':>10}{'cells':>8}{'cells/s':>12}{'peak bytes':>12}")
+    for name, maze in maze_set(sizes):
+        for engine in engines:
+            # each engine gets its own copy so that settings do not carry over
+            copy = Maze(maze.width, maze.height)
+            copy.init_walls_from_packed(maze.get_packed(), maze.height)
+            copy.set_goals(maze.get_goals())
+            result = bench(engine, copy, repeat)
+            results[engine + '/' + name] = result
+            report(f"{engine:12}{name:22}{result['median_us']:>10}{result['p95_us']:>10}"
+                   f"{result['cells']:>8}{result['cells_per_s']:>12}{result['peak_bytes']:>12}")
+    return results
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as file:
+        json.dump({key: result['median_us'] for key, result in results.items()}, file)
+
+
+def regressions(path, results, tolerance=0.25):
+    """
+    Compare the results with a saved baseline. Returns a list of
+    (key, baseline, median) for every one that is too slow.
+    """
+    with open(path) as file:
+        baseline = json.load(file)
+    slow = []
+    for key, result in results.items():
+        if key in baseline and result['median_us'] > baseline[key] * (1 + tolerance):
+            slow.append((key, baseline[key], result['median_us']))
+    return slow
+
+
+def parse_args(argv):
+    """
+    Simple option parsing that also works on MicroPython
+    """
+    options = {'engines': None, 'sizes': '16,32,64', 'repeat': '50',
+               'save': None, 'baseline': None, 'tolerance': '0.25'}
+    i = 0
+    while i < len(argv):
+        name = argv[i][2:]
+        if not argv[i].startswith('--') or name not in options or i + 1 >= len(argv):
+            raise ValueError("unknown option " + argv[i])
+        options[name] = argv[i + 1]
+        i += 2
+    return options
+
+
+def main(argv):
+    options = parse_args(argv)
+    engines = options['engines'].split(',') if options['engines'] else None
+    sizes = [int(size) for size in options['sizes'].split(',') if size]
+    results = run_benchmarks(engines, sizes, int(options['repeat']))
+    if options['save']:
+        save_baseline(options['save'], results)
+        print("baseline saved to " + options['save'])
+    if options['baseline']:
+        slow = regressions(options['baseline'], results, float(options['tolerance']))
+        for key, before, after in slow:
+            print(f"REGRESSION {key}: {before} us -> {after} us")
+        if slow:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
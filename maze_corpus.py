@@ -0,0 +1,103 @@
+# maze_corpus.py
+# Maze code for MicroPython
+# Copyright (c) 2024 Peter Harrison
+# Contributions from Paul Busby and David Hannaford
+# Released under the MIT License (https://opensource.org/licenses/MIT)
+
+"""
+ Store a lot of mazes in one binary file and load any one of them by number.
+
+ The file starts with a short header and then has the mazes back to back, all
+ the same size, with width * height bytes for each one. Each maze is either in the
+ standard .maz format or packed exactly as Maze.walls is stored.
+
+ The file is opened with mmap so that loading maze n only touches the bytes for
+ that maze, no matter how big the file is. The bytes are copied straight into
+ the walls of a Maze in one go.
+
+ This is for the desktop. MicroPython has no mmap.
+"""
+
+import mmap
+import struct
+
+from maze import Maze
+
+CORPUS_MAGIC = b'MAZC'
+CORPUS_HEADER = '<4sBBHHI'  # magic, format version, layout, width, height, maze count
+CORPUS_HEADER_SIZE = struct.calcsize(CORPUS_HEADER)
+CORPUS_VERSION = 2
+
+LAYOUT_MAZ = 0
+LAYOUT_PACKED = 1
+
+
+def write_corpus(path, mazes, packed=False):
+    """
+    Write a list of Maze objects, all the same size, to a corpus file.
+    With packed=False each maze is stored in .maz format, which only knows
+    about walls that are present. With packed=True the walls are stored
+    exactly as they are, including unknown and virtual walls.
+    """
+    width, height = (mazes[0].width, mazes[0].height) if mazes else (16, 16)
+    layout = LAYOUT_PACKED if packed else LAYOUT_MAZ
+    with open(path, 'wb') as file:
+        file.write(struct.pack(CORPUS_HEADER, CORPUS_MAGIC, CORPUS_VERSION, layout, width, height, len(mazes)))
+        for maze in mazes:
+            if maze.width != width or maze.height != height:
+                raise ValueError("all the mazes in a corpus must be the same size")
+            file.write(maze.get_packed() if packed else maze.get_maz())
+
+
+class MazeCorpus:
+    """
+    Read access to a corpus file made by write_corpus().
+
+      with MazeCorpus('mazes.mzc') as corpus:
+          maze = corpus.load(3)
+
+    corpus[n] gives the raw bytes of maze n.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.layout, self.width, self.height, self.count = struct.unpack_from(CORPUS_HEADER, self.data)
+        if magic != CORPUS_MAGIC or version != CORPUS_VERSION:
+            self.close()
+            raise ValueError("not a maze corpus file")
+        self.cells = self.width * self.height
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("maze index out of range")
+        start = CORPUS_HEADER_SIZE + index * self.cells
+        return self.data[start:start + self.cells]
+
+    def load(self, index, maze=None):
+        """
+        Load maze number index into a Maze and return it. Pass in a maze
+        to reuse it rather than making a new one.
+        """
+        if maze is None:
+            maze = Maze(self.width, self.height)
+        if self.layout == LAYOUT_PACKED:
+            maze.init_walls_from_packed(self[index], self.height)
+        else:
+            maze.init_walls_from_maz(self[index], self.height)
+        return maze
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
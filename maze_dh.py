@@ -10,11 +10,10 @@
 # Add these after any include statements at the start of your program
 WIDTH = 16  # is 16 in full size maze
 HEIGHT = 16  # is 16 in full size maze
-TABLEWIDTH = 16
-TABLEHEIGHT = 16
+TABLEWIDTH = WIDTH
+TABLEHEIGHT = HEIGHT
 START = 0  # the start cell number
-# int((TABLEWIDTH * HEIGHT /2) + (WIDTH / 2)) # middle of full size maze
-MIDDLE = 135   # middle cell number of a standard full size maze
+MIDDLE = TABLEWIDTH * (HEIGHT // 2) + WIDTH // 2 - 1  # middle cell number, 135 in a full size maze
 NORTH = 1      # bit value set when there is a wall on the North side of the cell
 EAST = 2       # bit value set when there is a wall on the North side of the cell
 SOUTH = 4      # bit value set when there is a wall on the North side of the cell
@@ -36,12 +35,28 @@ maze = [0] * numcells  # list that holds flood values for maze cells
 
 proclist = [0] * numcells  # This holds the list of cells to be processed next by the flood routine
 
+# Call this routine to change the size of the maze. It replaces the walls and flood tables
+# so call setoutsidewalls() again afterwards
+
+
+def setsize(width, height):
+    global WIDTH, HEIGHT, TABLEWIDTH, TABLEHEIGHT, MIDDLE, numcells, walls, maze, proclist
+    WIDTH = width
+    HEIGHT = height
+    TABLEWIDTH = width
+    TABLEHEIGHT = height
+    MIDDLE = TABLEWIDTH * (HEIGHT // 2) + WIDTH // 2 - 1
+    numcells = TABLEWIDTH * (TABLEHEIGHT + 1)
+    walls = [0] * numcells
+    maze = [0] * numcells
+    proclist = [0] * numcells
+
 # Call this routine to fill the flood table with high values prior to doing the flood
 
 
 def floodclear():  # clear the flood table
     global maze
-    for x in range(256):
+    for x in range(numcells):
         maze[x] = numcells
 
 # This routine does a Manhatten flood from the start cell to the finish cell
@@ -110,7 +125,7 @@ def setoutsidewalls():
         walls[y] = walls[y] | NORTH    # set top (NORTH) walls
         walls[x] = walls[x] | SOUTH    # set bottom (SOUTH) walls
     for x in range(HEIGHT):
-        y = (x * TABLEHEIGHT) + WIDTH - 1
+        y = (x * TABLEWIDTH) + WIDTH - 1
         walls[y] = walls[y] | EAST     # set right (EAST) walls
         y = x * TABLEWIDTH
         walls[y] = walls[y] | WEST     # set left (WEST) walls
@@ -192,19 +207,19 @@ def showflood():
     while y >= 0:                   # work down from the top
         line = '    '
         for x in range(WIDTH):
-            line += 'o---' if walls[y * WIDTH + x] & NORTH else 'o   '
+            line += 'o---' if walls[y * TABLEWIDTH + x] & NORTH else 'o   '
         line = line + 'o'
         print(line)
         line = f'{y:>2}  '  # the row number
         for x in range(WIDTH):
-            line += '|' if walls[y * WIDTH + x] & WEST else ' '
-            line += f'{maze[y * WIDTH + x]:>3}'
-        line = line + '|' if walls[y * WIDTH + x] & EAST else ' '
+            line += '|' if walls[y * TABLEWIDTH + x] & WEST else ' '
+            line += f'{maze[y * TABLEWIDTH + x]:>3}'
+        line = line + '|' if walls[y * TABLEWIDTH + x] & EAST else ' '
         print(line)
         y = y - 1
     line = '    '
     for x in range(WIDTH):
-        line += 'o---' if walls[0 * WIDTH + x] & SOUTH else 'o   '
+        line += 'o---' if walls[0 * TABLEWIDTH + x] & SOUTH else 'o   '
     line = line + 'o'
     print(line)
     line = '     '
@@ -222,18 +237,18 @@ def showwalls():
     while y >= 0:                   # work down from the top
         line = '    '
         for x in range(WIDTH):
-            line += 'o---' if walls[y * WIDTH + x] & NORTH else 'o   '
+            line += 'o---' if walls[y * TABLEWIDTH + x] & NORTH else 'o   '
         line = line + 'o'
         print(line)
         line = f'{y:>2}  '  # the row number
         for x in range(WIDTH):
-            line += '|   ' if walls[y * WIDTH + x] & WEST else '    '
-        line = line + '|' if walls[y * WIDTH + x] & EAST else ' '
+            line += '|   ' if walls[y * TABLEWIDTH + x] & WEST else '    '
+        line = line + '|' if walls[y * TABLEWIDTH + x] & EAST else ' '
         print(line)
         y = y - 1
     line = '    '
     for x in range(WIDTH):
-        line += 'o---' if walls[0 * WIDTH + x] & SOUTH else 'o   '
+        line += 'o---' if walls[0 * TABLEWIDTH + x] & SOUTH else 'o   '
     line = line + 'o'
     print(line)
     line = '     '
@@ -245,9 +260,10 @@ def showwalls():
 
 # ********************************************************************************
 # example usage
-setoutsidewalls()
-floodclear()
-floodmaze(MIDDLE, START)
-# these two statements will print out the flood table and the walls table
-showflood()
-showwalls()
+if __name__ == "__main__":
+    setoutsidewalls()
+    floodclear()
+    floodmaze(MIDDLE, START)
+    # these two statements will print out the flood table and the walls table
+    showflood()
+    showwalls()
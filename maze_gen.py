@@ -0,0 +1,395 @@
+# maze_gen.py
+# Maze code for MicroPython
+# Copyright (c) 2024 Peter Harrison
+# Contributions from Paul Busby and David Hannaford
+# Released under the MIT License (https://opensource.org/licenses/MIT)
+
+"""
+ Make random mazes for testing and benchmarking.
+
+ Each generator takes a Maze, which can be any size or shape, and a seed and
+ writes the new walls straight into maze.walls. The same seed always gives the
+ same maze. Every wall is known afterwards so the maze is a complete map.
+
+   perfect(maze, seed)      - a random spanning tree made by a backtracker. There
+                              are long winding paths and exactly one route between
+                              any two cells
+   binary_tree(maze, seed)  - also a perfect maze but it is made with a few
+                              operations on big integers so it is very quick. It
+                              is biased so that every cell has an easy route to
+                              the top right corner
+   sidewinder(maze, seed)   - another quick perfect maze made with big integers.
+                              The first column is one corridor and the rest
+                              is made of runs up the columns joined to the West
+   competition(maze, seed)  - like a contest maze. The goal area is walled off
+                              except for one entrance, the start cell has walls on
+                              three sides and there are some loops
+   loopy(maze, seed)        - a perfect maze with a lot of the walls taken out
+                              so there are many routes to everywhere
+   corridor(maze, seed)     - one corridor snaking through every cell, the worst
+                              case for a flood as the path is as long as it can
+                              be. The seed decides if it goes up and down the
+                              columns or along the rows
+
+ On the desktop, binary_tree, sidewinder and corridor make tens of thousands
+ of 16x16 mazes a second. Use them when a sweep needs a lot of mazes. The
+ backtracker in perfect, competition and loopy has to step through every cell
+ in Python. Even with a preallocated stack and batched random numbers it makes
+ only 2,000 to 3,000 a second. A union-find version was no quicker.
+
+ Walls are worked out as bytes in the .maz format, with a bit set for each wall,
+ and then converted to the Maze format in one go.
+"""
+
+import random
+from array import array
+
+from maze import MAZ_TO_WALLS, DIR_NORTH, DIR_EAST, DIR_SOUTH, DIR_WEST
+
+# SPREAD[b] has the eight bits of b as eight bytes, lowest bit first
+SPREAD = [bytes([b >> bit & 1 for bit in range(8)]) for b in range(256)]
+CLOSED = 15  # .maz byte for a cell with all four walls
+# KNOCK_DOWN[direction] clears the .maz bit for the wall in that direction
+KNOCK_DOWN = (14, 13, 11, 7)
+
+
+def make_rng(seed):
+    """
+    Return a random number generator for the seed. The seed can be a number,
+    None for a random maze, or a generator that is already set up.
+    MicroPython has no random.Random so the random module itself is used there.
+    """
+    if hasattr(seed, 'getrandbits'):
+        return seed
+    if hasattr(random, 'Random'):
+        return random.Random(seed)
+    if seed is not None:
+        random.seed(seed)
+    return random
+
+
+def random_bits(rng, count):
+    """
+    A random integer with count bits. MicroPython can only make 32 at a time.
+    """
+    bits = 0
+    while count > 32:
+        bits = bits << 32 | rng.getrandbits(32)
+        count -= 32
+    return bits << count | rng.getrandbits(count)
+
+
+def set_walls(maze, codes):
+    """
+    Copy the .maz bytes for every cell into the walls of the maze
+    """
+    walls = maze.walls
+    if hasattr(codes, 'translate'):
+        walls[:] = codes.translate(MAZ_TO_WALLS)
+    else:
+        # MicroPython has no translate
+        for cell in range(len(codes)):
+            walls[cell] = MAZ_TO_WALLS[codes[cell]]
+    maze.walls_replaced()
+
+
+def spread(bits, cells):
+    """
+    Turn an integer with a bit for each cell into one with a byte for each cell
+    """
+    data = bits.to_bytes((cells + 7) // 8, 'little')
+    return int.from_bytes(b''.join([SPREAD[b] for b in data]), 'little')
+
+
+def exit_bits(maze, north, east):
+    """
+    Turn two integers with a bit set for each cell that has an exit to the
+    North or to the East into one integer with the .maz bits of every cell
+    for those exits. The exits to the South and West are the same exits seen
+    from the other side so they are just the North and East bits moved along
+    by one cell or one column.
+    """
+    cells = maze.width * maze.height
+    full = (1 << cells) - 1
+    south = north << 1 & full
+    west = east << maze.height & full
+    return (spread(north, cells)
+            | spread(east, cells) << 1
+            | spread(south, cells) << 2
+            | spread(west, cells) << 3)
+
+
+def codes_from_exits(maze, north, east):
+    """
+    Make the .maz bytes for every cell of a maze that only has the exits
+    given by the North and East bits, as for exit_bits()
+    """
+    cells = maze.width * maze.height
+    closed = int.from_bytes(bytes([CLOSED]) * cells, 'little')
+    return (closed & ~exit_bits(maze, north, east)).to_bytes(cells, 'little')
+
+
+def edge_cells(maze):
+    """
+    Two integers with a bit set for each cell in the top row and for each
+    cell in the right hand column. These cells have no exit to the North
+    and to the East.
+    """
+    width, height = maze.width, maze.height
+    cells = width * height
+    top = 0
+    for x in range(width):
+        top |= 1 << (x * height + height - 1)
+    right = ((1 << height) - 1) << (cells - height)
+    return top, right
+
+
+def binary_tree(maze, seed=None):
+    """
+    Every cell opens either to the North or to the East, chosen by one random
+    bit. Cells on the top row have to go East and cells in the right hand
+    column have to go North. All the bits are handled at once as big integers.
+    """
+    rng = make_rng(seed)
+    cells = maze.width * maze.height
+    full = (1 << cells) - 1
+    top, right = edge_cells(maze)
+    bits = random_bits(rng, cells)
+    north = (bits | right) & full & ~top
+    east = (~bits | top) & full & ~right
+    set_walls(maze, codes_from_exits(maze, north, east))
+
+
+def sidewinder(maze, seed=None):
+    """
+    The first column is one corridor. In every other column, each cell opens
+    to the North with one random bit, which splits the column into runs of
+    joined cells. Each run then opens to the West from one of its cells, the
+    first one to get a random bit or the top one if none of them do. That
+    makes a perfect maze and, as with binary_tree(), all the bits are handled
+    at once as big integers.
+    """
+    rng = make_rng(seed)
+    height = maze.height
+    cells = maze.width * height
+    full = (1 << cells) - 1
+    top, right = edge_cells(maze)
+    first = (1 << height) - 1
+    north = (random_bits(rng, cells) | first) & full & ~top
+    # a run ends at a cell with no exit to the North and the next run
+    # starts in the cell above it, or at the bottom of the next column
+    ends = full & ~north
+    starts = (ends << 1 | 1) & full
+    # taking away the start of each run borrows up to the first bit that
+    # is set in that run, and never further as the end of the run is set
+    picks = random_bits(rng, cells) | ends
+    west = picks & ~(picks - starts) & full & ~first
+    set_walls(maze, codes_from_exits(maze, north, west >> height))
+
+
+def carve(maze, rng, codes, visited, start):
+    """
+    Carve passages from the start cell with a depth first search, knocking
+    down the wall into a random unvisited neighbour until there are none left
+    and then backing up. Cells already marked as visited are left alone.
+    The stack is a preallocated array and the random numbers are taken a few
+    at a time from one 30 bit number as this loop is where the time goes.
+    """
+    height = maze.height
+    cells = maze.width * height
+    top = height - 1
+    offsets = (1, height, -1, -height)
+    stack = array('H', [0]) * cells
+    depth = 0
+    stack[0] = cell = start
+    visited[start] = 1
+    choices = [0, 0, 0, 0]
+    bits = 0
+    while True:
+        y = cell % height
+        count = 0
+        if y < top and not visited[cell + 1]:
+            choices[0] = DIR_NORTH
+            count = 1
+        if cell + height < cells and not visited[cell + height]:
+            choices[count] = DIR_EAST
+            count += 1
+        if y > 0 and not visited[cell - 1]:
+            choices[count] = DIR_SOUTH
+            count += 1
+        if cell >= height and not visited[cell - height]:
+            choices[count] = DIR_WEST
+            count += 1
+        if count == 0:
+            if depth == 0:
+                return
+            depth -= 1
+            cell = stack[depth]
+            continue
+        direction = choices[0]
+        if count > 1:
+            if bits < 256:
+                bits = rng.getrandbits(30) | 1 << 30
+            direction = choices[bits % count]
+            bits //= count
+        next = cell + offsets[direction]
+        codes[cell] &= KNOCK_DOWN[direction]
+        codes[next] &= KNOCK_DOWN[direction ^ 2]
+        visited[next] = 1
+        depth += 1
+        stack[depth] = cell = next
+
+
+def perfect(maze, seed=None):
+    """
+    A perfect maze made by the recursive backtracker
+    """
+    cells = maze.width * maze.height
+    codes = bytearray([CLOSED]) * cells
+    carve(maze, make_rng(seed), codes, bytearray(cells), 0)
+    set_walls(maze, codes)
+
+
+def open_walls(maze, rng, codes, chance, keep=None):
+    """
+    Knock down the inside walls at random, each with a chance of 1 in 2**chance.
+    No wall of a cell in keep is touched. All the walls are done at once with
+    big integers, in the same way as binary_tree().
+    """
+    height = maze.height
+    cells = maze.width * height
+    full = (1 << cells) - 1
+    top, right = edge_cells(maze)
+    kept = 0
+    for cell in keep or ():
+        kept |= 1 << cell
+    north = east = full
+    for _ in range(chance):
+        north &= random_bits(rng, cells)
+        east &= random_bits(rng, cells)
+    north &= ~(top | kept | kept >> 1)
+    east &= ~(right | kept | kept >> height)
+    walls = int.from_bytes(codes, 'little') & ~exit_bits(maze, north, east)
+    codes[:] = walls.to_bytes(cells, 'little')
+
+
+def loopy(maze, seed=None, chance=2):
+    """
+    A perfect maze with about one in 2**chance of the remaining
+    inside walls taken out
+    """
+    rng = make_rng(seed)
+    cells = maze.width * maze.height
+    codes = bytearray([CLOSED]) * cells
+    carve(maze, rng, codes, bytearray(cells), 0)
+    open_walls(maze, rng, codes, chance)
+    set_walls(maze, codes)
+
+
+def competition(maze, seed=None, chance=4):
+    """
+    A maze laid out like a contest maze. The goal area, which is the default
+    goal for the size of maze, has no walls inside it and only one entrance.
+    The start cell has walls on three sides and opens to the North. The rest
+    is a perfect maze with about one in 2**chance of the remaining walls taken
+    out to make loops. The goal of the maze is set to the goal area.
+    """
+    rng = make_rng(seed)
+    height = maze.height
+    cells = maze.width * height
+    offsets = (1, height, -1, -height)
+    codes = bytearray([CLOSED]) * cells
+    visited = bytearray(cells)
+    goals = maze.default_goals()
+    for cell in goals:
+        visited[cell] = 1
+        for direction in range(4):
+            if cell + offsets[direction] in goals and maze.neighbour(cell, direction) == cell + offsets[direction]:
+                codes[cell] &= ~(1 << direction)
+    # the start cell can only go North so the search begins one cell up
+    visited[0] = 1
+    codes[0] &= ~(1 << DIR_NORTH)
+    codes[1] &= ~(1 << DIR_SOUTH)
+    carve(maze, rng, codes, visited, 1)
+    # one way into the goal
+    entrances = []
+    for cell in goals:
+        x, y = maze.cell_xy(cell)
+        for direction, inside in ((DIR_NORTH, y < height - 1), (DIR_EAST, x < maze.width - 1),
+                                  (DIR_SOUTH, y > 0), (DIR_WEST, x > 0)):
+            if inside and cell + offsets[direction] not in goals:
+                entrances.append((cell, direction))
+    cell, direction = entrances[rng.randrange(len(entrances))]
+    codes[cell] &= ~(1 << direction)
+    codes[cell + offsets[direction]] &= ~(1 << (direction + 2) % 4)
+    open_walls(maze, rng, codes, chance, set(goals + [0]))
+    set_walls(maze, codes)
+    maze.set_goals(goals)
+
+
+def corridor(maze, seed=None):
+    """
+    A single corridor up the first column, down the next and so on or,
+    depending on the seed, along the first row, back along the next and so on.
+    There are only two of these for each size so they are worked out once.
+    """
+    width, height = maze.width, maze.height
+    rows = make_rng(seed).getrandbits(1)
+    codes = corridors.get((width, height, rows))
+    if codes is None:
+        codes = corridors[(width, height, rows)] = make_corridor(width, height, rows)
+    set_walls(maze, codes)
+
+
+corridors = {}
+
+
+def make_corridor(width, height, rows=False):
+    codes = bytearray([CLOSED]) * (width * height)
+    if rows:
+        for y in range(height):
+            for x in range(width - 1):
+                codes[x * height + y] &= ~(1 << DIR_EAST)
+                codes[(x + 1) * height + y] &= ~(1 << DIR_WEST)
+            if y < height - 1:
+                turn = (width - 1 if y % 2 == 0 else 0) * height + y
+                codes[turn] &= ~(1 << DIR_NORTH)
+                codes[turn + 1] &= ~(1 << DIR_SOUTH)
+        return bytes(codes)
+    for x in range(width):
+        column = x * height
+        for y in range(height - 1):
+            codes[column + y] &= ~(1 << DIR_NORTH)
+            codes[column + y + 1] &= ~(1 << DIR_SOUTH)
+        if x < width - 1:
+            turn = column + (height - 1 if x % 2 == 0 else 0)
+            codes[turn] &= ~(1 << DIR_EAST)
+            codes[turn + height] &= ~(1 << DIR_WEST)
+    return bytes(codes)
+
+
+# the generators that can be chosen by name
+GENERATORS = {
+    'perfect': perfect,
+    'binary_tree': binary_tree,
+    'sidewinder': sidewinder,
+    'competition': competition,
+    'loopy': loopy,
+    'corridor': corridor,
+}
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from maze import Maze, VIEW_PLAIN
+
+    for name, generator in GENERATORS.items():
+        maze = Maze()
+        count = 1000
+        start_time = time.time()
+        for seed in range(count):
+            generator(maze, seed)
+        t = time.time() - start_time
+        print(maze.get_maze_string(VIEW_PLAIN))
+        print(f"{sys.implementation.name} - {name}: {count / t:.0f} mazes per second")
@@ -0,0 +1,111 @@
+# maze_numpy.py
+# Maze code for MicroPython
+# Copyright (c) 2024 Peter Harrison
+# Contributions from Paul Busby and David Hannaford
+# Released under the MIT License (https://opensource.org/licenses/MIT)
+
+"""
+ Flood a whole batch of mazes at once using NumPy.
+
+ This is for the desktop only, when you want to look at a large collection
+ of mazes. NumPy is only imported here so maze.py still runs on MicroPython.
+
+ The walls for a batch are a NumPy array with the shape (N, width, height), holding
+ the walls of each maze in the same encoding and order as Maze.walls. That is,
+ walls[n, x, y] is the walls byte for cell (x, y) of maze n. The costs come back
+ in the same shape and are exactly the values that Maze.flood() would give.
+"""
+
+import numpy as np
+
+from maze import (WALL_MASK, OPEN_MAZE_MASK,
+                  DIR_NORTH, DIR_EAST, DIR_SOUTH, DIR_WEST)
+
+
+def walls_from_mazes(mazes):
+    """
+    Stack the walls of a list of Maze objects, all the same size, into
+    an array with the shape (N, width, height)
+    """
+    width, height = mazes[0].width, mazes[0].height
+    walls = np.empty((len(mazes), width, height), dtype=np.uint8)
+    for n, maze in enumerate(mazes):
+        walls[n] = np.frombuffer(maze.walls, dtype=np.uint8).reshape(width, height)
+    return walls
+
+
+def exits(walls, direction, mask):
+    """
+    Boolean array that is True where a cell has an exit in the given direction
+    under the mask. Exits off the edge of the maze are never allowed.
+    """
+    result = (walls >> direction * 2) & (WALL_MASK & mask) == 0
+    if direction == DIR_NORTH:
+        result[:, :, -1] = False
+    elif direction == DIR_EAST:
+        result[:, -1, :] = False
+    elif direction == DIR_SOUTH:
+        result[:, :, 0] = False
+    else:
+        result[:, 0, :] = False
+    return result
+
+
+def flood_batch(walls, targets, mask=OPEN_MAZE_MASK):
+    """
+    Flood every maze in the batch from the list of target cells and return
+    the costs as an array the same shape as walls.
+
+    Each step of the flood moves the wavefront of every maze one cell in
+    each direction with a few whole-array operations. The loop runs once for
+    each step along the longest path in any of the mazes, no matter how many
+    mazes there are. Cells that cannot be reached get a cost of width * height,
+    the same as Maze.MAX_COST.
+    """
+    count, width, height = walls.shape
+    max_cost = width * height
+    north = exits(walls, DIR_NORTH, mask)
+    east = exits(walls, DIR_EAST, mask)
+    south = exits(walls, DIR_SOUTH, mask)
+    west = exits(walls, DIR_WEST, mask)
+
+    dtype = np.uint16 if max_cost < 65536 else np.uint32
+    cost = np.full(walls.shape, max_cost, dtype=dtype)
+    front = np.zeros(walls.shape, dtype=bool)
+    for cell in targets:
+        x, y = divmod(cell, height)
+        front[:, x, y] = True
+    cost[front] = 0
+    reached = front.copy()
+    step = np.empty_like(front)
+    moved = np.empty_like(front)
+
+    distance = 0
+    while front.any():
+        distance += 1
+        step[:] = False
+        np.logical_and(front, north, out=moved)
+        step[:, :, 1:] |= moved[:, :, :-1]
+        np.logical_and(front, east, out=moved)
+        step[:, 1:, :] |= moved[:, :-1, :]
+        np.logical_and(front, south, out=moved)
+        step[:, :, :-1] |= moved[:, :, 1:]
+        np.logical_and(front, west, out=moved)
+        step[:, :-1, :] |= moved[:, 1:, :]
+        step &= ~reached
+        reached |= step
+        cost[step] = distance
+        front, step = step, front
+    return cost
+
+
+def flood_mazes(mazes, target=None, mask=OPEN_MAZE_MASK):
+    """
+    Flood a list of Maze objects, all the same size, in one batch. The target
+    is a cell or list of cells, or the goal set of the first maze if left out.
+    Returns the costs with the shape (N, width * height) so that row n can be
+    compared directly with mazes[n].cost after a flood.
+    """
+    targets = mazes[0].targets(target)
+    cost = flood_batch(walls_from_mazes(mazes), targets, mask)
+    return cost.reshape(len(mazes), -1)
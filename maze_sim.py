@@ -0,0 +1,259 @@
+# maze_sim.py
+# Maze code for MicroPython
+# Copyright (c) 2024 Peter Harrison
+# Contributions from Paul Busby and David Hannaford
+# Released under the MIT License (https://opensource.org/licenses/MIT)
+
+"""
+ A simple simulator for the search run.
+
+ The simulator holds a complete 'truth' maze and a virtual mouse with its own
+ Maze that starts out knowing nothing. As the mouse moves from cell to cell,
+ it is shown the walls to its left, front and right and puts them into its
+ map with update_wall(), just as a real mouse would. A strategy decides which
+ way to go next. The mouse searches its way to the goal and then back to the
+ start while the simulator counts what it did and how long the floods took.
+
+ This lets you measure how changes to the flood or to the search strategy
+ affect the whole search, not just one flood.
+"""
+
+from maze import *
+
+
+def maze_from_lines(lines):
+    """
+    Make a Maze from a maze stored as lines of text, as in maze_files.py
+    """
+    maze = Maze()
+    maze.init_walls_from_string(lines)
+    return maze
+
+
+class FloodStrategy:
+    """
+    The classic search. Flood for search to the target after every move and
+    go to the neighbour with the smallest cost.
+
+    Every strategy has a choose() method that returns the direction to go
+    next, or None if the target cannot be reached.
+    """
+    name = 'flood'
+
+    def setup(self, maze):
+        maze.set_incremental(False)
+
+    def choose(self, sim):
+        maze = sim.maze
+        sim.flood(sim.target)
+        if maze.cost[sim.cell] == maze.MAX_COST:
+            return None
+        return maze.direction_to_smallest(sim.cell, sim.heading)
+
+
+class IncrementalStrategy(FloodStrategy):
+    """
+    The classic search but the costs are repaired after each move
+    rather than flooding the whole maze again.
+    """
+    name = 'incremental'
+
+    def setup(self, maze):
+        maze.set_incremental(True)
+
+
+class FrontierStrategy(FloodStrategy):
+    """
+    Explore the cells that could still be on the shortest route before
+    heading for the target. The mouse goes to the nearest unvisited cell on
+    a shortest route from the start to the goal in the open maze, following
+    the exploration_route() to it. Once there is nothing left to explore,
+    the speed run is known and it follows the path_to_nearest() target cell.
+    It only plans again when it gets to the end of the route, the cell it is
+    going to has been seen from somewhere else or a new wall blocks the way.
+
+    Planning does not flood unless a new wall might have changed the shortest
+    routes, and then it floods twice, so there are far fewer floods than
+    with the classic search.
+    """
+    name = 'frontier'
+
+    def setup(self, maze):
+        maze.set_incremental(False)
+        self.route = []
+
+    def plan(self, sim):
+        maze = sim.maze
+        start_time = ticks_us()
+        floods = maze.explore_floods
+        route = maze.exploration_route(sim.cell, sim.heading)
+        if not route:
+            route = maze.path_to_nearest(sim.cell, sim.target, sim.heading)
+        self.route = route[1:]
+        sim.stats['flood_us'] += ticks_diff(ticks_us(), start_time)
+        sim.stats['floods'] += maze.explore_floods - floods
+
+    def next_step(self, sim):
+        """
+        The direction to the next cell of the route or None if the
+        route has finished or is no longer any use
+        """
+        maze = sim.maze
+        route = self.route
+        if not route:
+            return None
+        end = route[-1]
+        if end not in sim.target and maze.cell_is_visited(end):
+            return None
+        for direction in range(DIR_COUNT):
+            if maze.neighbour(sim.cell, direction) == route[0]:
+                if maze.cell_has_exit(sim.cell, direction):
+                    route.pop(0)
+                    return direction
+        return None
+
+    def choose(self, sim):
+        direction = self.next_step(sim)
+        if direction is None:
+            self.plan(sim)
+            direction = self.next_step(sim)
+        return direction
+
+
+# the strategies that can be chosen by name
+STRATEGIES = {
+    FloodStrategy.name: FloodStrategy,
+    IncrementalStrategy.name: IncrementalStrategy,
+    FrontierStrategy.name: FrontierStrategy,
+}
+
+
+class SearchSimulator:
+    """
+    Run a virtual mouse through a known maze.
+
+    After run(), the results are in the stats dictionary:
+
+      cells          - cells travelled
+      floods         - floods asked for by the strategy
+      wall_updates   - walls that the mouse learned about
+      flood_us       - total time spent in those floods, in microseconds
+      goal_cells     - cells travelled when the goal was first reached
+      solved_cells   - cells travelled when speed_run_possible() first became True
+      returned       - True if the mouse got back to the start
+      run_length     - the speed run cost from start to goal at the end
+    """
+
+    def __init__(self, truth, strategy=None):
+        self.truth = truth
+        self.maze = Maze(truth.width, truth.height)
+        self.maze.set_goals(truth.get_goals())
+        if strategy is None:
+            strategy = FloodStrategy()
+        self.strategy = strategy
+        strategy.setup(self.maze)
+        # the referee shares the mouse walls so that checking for a speed run
+        # does not upset the costs, or the incremental flood, of the mouse
+        self.referee = Maze(truth.width, truth.height)
+        self.referee.walls = self.maze.walls
+        self.referee.set_goals(truth.get_goals())
+        self.start = 0
+        self.cell = self.start
+        self.heading = DIR_NORTH
+        self.target = self.maze.get_goals()
+        self.stats = {
+            'cells': 0,
+            'floods': 0,
+            'wall_updates': 0,
+            'flood_us': 0,
+            'goal_cells': None,
+            'solved_cells': None,
+            'returned': False,
+            'run_length': None,
+        }
+
+    def flood(self, target=None):
+        """
+        Flood the mouse maze for search, keeping count of the floods
+        and the time taken. Strategies should use this to flood.
+        """
+        start_time = ticks_us()
+        cost = self.maze.flood_for_search(target)
+        self.stats['flood_us'] += ticks_diff(ticks_us(), start_time)
+        self.stats['floods'] += 1
+        return cost
+
+    def sense(self, directions):
+        """
+        Show the mouse the real walls of its cell in the given directions
+        """
+        truth = self.truth.walls[self.cell]
+        for direction in directions:
+            state = (truth >> direction * 2) & WALL_MASK
+            if state == WALL_UNKNOWN:
+                continue
+            if self.maze.walls[self.cell] >> direction * 2 & WALL_MASK == WALL_UNKNOWN:
+                self.maze.update_wall(self.cell, direction, state)
+                self.stats['wall_updates'] += 1
+
+    def sense_ahead(self):
+        """
+        Look to the left, front and right of the mouse
+        """
+        heading = self.heading
+        self.sense(((heading + 3) % DIR_COUNT, heading, (heading + 1) % DIR_COUNT))
+
+    def check_solved(self):
+        if self.stats['solved_cells'] is None and self.referee.speed_run_possible():
+            self.stats['solved_cells'] = self.stats['cells']
+
+    def move(self, direction):
+        """
+        Turn to face the direction and move one cell.
+        Returns False if the real maze has a wall in the way.
+        """
+        if self.truth.walls[self.cell] >> direction * 2 & WALL_MASK != WALL_ABSENT:
+            return False
+        self.heading = direction
+        self.cell = self.maze.neighbour(self.cell, direction)
+        self.stats['cells'] += 1
+        return True
+
+    def go_to(self, targets, max_cells):
+        """
+        Search until the mouse gets to one of the target cells.
+        Returns False if it cannot get there.
+        """
+        self.target = targets
+        while self.cell not in targets:
+            if self.stats['cells'] >= max_cells:
+                return False
+            direction = self.strategy.choose(self)
+            if direction is None:
+                return False
+            if not self.move(direction):
+                return False
+            self.sense_ahead()
+            self.check_solved()
+        return True
+
+    def run(self, max_cells=10000):
+        """
+        Search from the start to the goal and back again.
+        Returns the stats dictionary.
+        """
+        self.sense(range(DIR_COUNT))
+        if self.go_to(self.maze.get_goals(), max_cells):
+            self.stats['goal_cells'] = self.stats['cells']
+            self.stats['returned'] = self.go_to([self.start], max_cells)
+        self.stats['run_length'] = self.maze.flood_for_speed_run()
+        return self.stats
+
+
+if __name__ == "__main__":
+    from maze_files import *
+
+    for name in STRATEGIES:
+        sim = SearchSimulator(maze_from_lines(all_japan_2007), STRATEGIES[name]())
+        stats = sim.run()
+        print(f"{name:12} {stats}")
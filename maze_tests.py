@@ -13,6 +13,11 @@ import time
 from maze import *
 from maze_files import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def millis():
     """
@@ -77,6 +82,17 @@ class TestMazeWalls(unittest.TestCase):
         maze = Maze()
         self.assertEqual(maze.cost[0], maze.MAX_COST)
 
+    def test_maze_buffers_are_reused(self):
+        maze = Maze()
+        cost = maze.cost
+        walls = maze.walls
+        maze.flood()
+        maze.init_walls()
+        maze.flood_for_speed_run()
+        self.assertIs(maze.cost, cost)
+        self.assertIs(maze.walls, walls)
+        self.assertIsInstance(maze.walls, bytearray)
+
     def test_maze_mask_setting(self):
         maze = Maze()
         self.assertEqual(maze.mask, OPEN_MAZE_MASK)
@@ -144,6 +160,38 @@ class TestMazeWalls(unittest.TestCase):
         maze.update_wall(cell, DIR_SOUTH, WALL_ABSENT)
         self.assertFalse(maze.cell_has_exit(cell, DIR_SOUTH))
 
+    def test_maze_update_walls(self):
+        maze = Maze()
+        single = Maze()
+        cell = maze.cell_id(3, 4)
+        updates = [(cell, DIR_NORTH, WALL_PRESENT), (cell, DIR_EAST, WALL_ABSENT),
+                   (cell, DIR_WEST, None), (maze.cell_id(0, 15), DIR_NORTH, WALL_ABSENT)]
+        version = maze.version
+        self.assertTrue(maze.update_walls(updates))
+        self.assertGreater(maze.version, version)
+        for update in updates[:2]:
+            single.update_wall(*update)
+        self.assertEqual(bytes(maze.walls), bytes(single.walls))
+        self.assertTrue(maze.cell_has_wall(cell + 1, DIR_SOUTH))
+        self.assertEqual(maze.walls[cell] >> DIR_WEST * 2 & WALL_MASK, WALL_UNKNOWN)
+        version = maze.version
+        self.assertFalse(maze.update_walls(updates))
+        self.assertEqual(maze.version, version)
+
+    def test_maze_update_walls_relative(self):
+        maze = Maze()
+        maze.set_incremental(True)
+        maze.flood_for_search()
+        cell = maze.cell_id(2, 2)
+        self.assertTrue(maze.update_walls_relative(cell, DIR_EAST, WALL_PRESENT, WALL_ABSENT, WALL_PRESENT))
+        self.assertTrue(maze.cell_has_wall(cell, DIR_NORTH))
+        self.assertTrue(maze.cell_has_exit(cell, DIR_EAST))
+        self.assertTrue(maze.cell_has_wall(cell, DIR_SOUTH))
+        self.assertEqual(maze.changed_walls, [cell * 4 + DIR_NORTH, cell * 4 + DIR_EAST, cell * 4 + DIR_SOUTH])
+        self.assertFalse(maze.update_walls_relative(cell, DIR_EAST, WALL_PRESENT, WALL_ABSENT, WALL_PRESENT))
+        repaired = maze.flood_for_search()
+        self.assertEqual(repaired, maze.flood())
+
 
 class TestMazeCellVisited(unittest.TestCase):
     def test_maze_cell_is_visited(self):
@@ -163,6 +211,26 @@ class TestMazeGoal(unittest.TestCase):
         maze = Maze()
         maze.set_goal(maze.cell_id(8, 8))
         self.assertEqual(maze.get_goal(), maze.cell_id(8, 8))
+        self.assertEqual(maze.get_goals(), [maze.cell_id(8, 8)])
+
+    def test_maze_goals_default(self):
+        maze = Maze()
+        goals = [maze.cell_id(7, 7), maze.cell_id(7, 8),
+                 maze.cell_id(8, 7), maze.cell_id(8, 8)]
+        self.assertEqual(sorted(maze.get_goals()), sorted(goals))
+
+    def test_maze_goals_half_size(self):
+        maze = Maze(32)
+        goals = [maze.cell_id(15, 15), maze.cell_id(15, 16),
+                 maze.cell_id(16, 15), maze.cell_id(16, 16)]
+        self.assertEqual(sorted(maze.get_goals()), sorted(goals))
+
+    def test_maze_set_goals(self):
+        maze = Maze()
+        goals = [maze.cell_id(2, 3), maze.cell_id(5, 5)]
+        maze.set_goals(goals)
+        self.assertEqual(maze.get_goals(), goals)
+        self.assertEqual(maze.get_goal(), maze.cell_id(2, 3))
 
 
 class TestMazeFlood(unittest.TestCase):
@@ -198,6 +266,149 @@ class TestMazeFlood(unittest.TestCase):
         self.assertEqual(maze.cost[top_right], 30)
 
 
+    def test_maze_flood_goal_set(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.flood()
+        for goal in maze.get_goals():
+            self.assertEqual(maze.cost[goal], 0)
+        combined = list(maze.cost)
+        single = [maze.MAX_COST] * len(combined)
+        for goal in maze.get_goals():
+            maze.flood(goal)
+            single = [min(a, b) for a, b in zip(single, maze.cost)]
+        self.assertEqual(combined, single)
+
+    def test_maze_flood_for_search_uses_goals(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        self.assertEqual(maze.flood_for_search(), 71)
+        self.assertEqual(maze.flood_for_search(maze.get_goal()), 72)
+        self.assertEqual(maze.flood_for_speed_run(), 71)
+
+
+class TestMazeBitboardFlood(unittest.TestCase):
+
+    def check_engines_agree(self, maze):
+        for mask in (OPEN_MAZE_MASK, CLOSED_MAZE_MASK):
+            maze.set_mask(mask)
+            maze.set_engine(FLOOD_QUEUE)
+            expected = maze.flood()
+            expected_cost = list(maze.cost)
+            maze.set_engine(FLOOD_BITBOARD)
+            self.assertEqual(maze.flood(), expected)
+            self.assertEqual(list(maze.cost), expected_cost)
+
+    def test_bitboard_empty_maze(self):
+        maze = Maze()
+        self.check_engines_agree(maze)
+
+    def test_bitboard_loaded_maze(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        self.check_engines_agree(maze)
+
+    def test_bitboard_single_target(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.set_engine(FLOOD_BITBOARD)
+        self.assertEqual(maze.flood(maze.get_goal()), 72)
+
+    def test_bitboard_follows_wall_changes(self):
+        import random
+        rng = random.Random(99)
+        maze = Maze()
+        maze.set_engine(FLOOD_BITBOARD)
+        maze.flood_for_search()
+        maze.flood_for_speed_run()
+        for _ in range(100):
+            cell = rng.randrange(maze.size * maze.size)
+            state = rng.choice([WALL_PRESENT, WALL_ABSENT])
+            maze.update_wall(cell, rng.randrange(DIR_COUNT), state)
+            self.check_engines_agree(maze)
+
+
+class TestMazeRepairFlood(unittest.TestCase):
+
+    def check_repair(self, flood_name, states):
+        import random
+        rng = random.Random(1234)
+        maze = Maze()
+        reference = Maze()
+        maze.set_incremental(True)
+        getattr(maze, flood_name)()
+        for _ in range(100):
+            for _ in range(rng.randint(1, 3)):
+                cell = rng.randrange(maze.size * maze.size)
+                direction = rng.randrange(DIR_COUNT)
+                state = rng.choice(states)
+                maze.update_wall(cell, direction, state)
+                reference.update_wall(cell, direction, state)
+            cost = getattr(maze, flood_name)()
+            self.assertEqual(cost, getattr(reference, flood_name)())
+            self.assertEqual(list(maze.cost), list(reference.cost))
+
+    def test_repair_matches_full_flood_open(self):
+        self.check_repair('flood_for_search', [WALL_PRESENT, WALL_ABSENT])
+
+    def test_repair_matches_full_flood_closed(self):
+        self.check_repair('flood_for_speed_run', [WALL_PRESENT, WALL_ABSENT])
+
+    def test_repair_only_after_matching_flood(self):
+        maze = Maze()
+        maze.set_incremental(True)
+        maze.flood_for_search()
+        self.assertEqual(maze.changed_walls, [])
+        maze.update_wall(maze.cell_id(0, 1), DIR_NORTH, WALL_PRESENT)
+        maze.update_wall(maze.cell_id(0, 1), DIR_EAST, WALL_PRESENT)
+        self.assertEqual(len(maze.changed_walls), 2)
+        self.assertEqual(maze.flood_for_search(), maze.MAX_COST)
+        self.assertEqual(maze.changed_walls, [])
+        maze.init_walls()
+        self.assertIsNone(maze.changed_walls)
+        self.assertEqual(maze.flood_for_search(), 14)
+
+    def test_target_list_changed_in_place(self):
+        maze = Maze()
+        maze.set_incremental(True)
+        targets = [maze.cell_id(7, 7)]
+        self.assertEqual(maze.flood_for_search(targets), 14)
+        targets[0] = maze.cell_id(0, 3)
+        self.assertEqual(maze.flood_for_search(targets), 3)
+
+
+class TestMazeFloodToCell(unittest.TestCase):
+
+    def test_flood_to_cell_matches_flood(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.flood()
+        full = list(maze.cost)
+        for cell in range(maze.size * maze.size):
+            self.assertEqual(maze.flood_to_cell(cell), full[cell])
+
+    def test_flood_to_cell_neighbours(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.flood()
+        expected = [[maze.direction_to_smallest(cell, heading)
+                     for heading in range(DIR_COUNT)]
+                    for cell in range(maze.size * maze.size)]
+        for cell in range(maze.size * maze.size):
+            maze.flood_to_cell(cell, neighbours=True)
+            for heading in range(DIR_COUNT):
+                self.assertEqual(maze.direction_to_smallest(cell, heading),
+                                 expected[cell][heading])
+
+    def test_flood_to_cell_stops_early(self):
+        maze = Maze()
+        maze.init_walls()
+        cell = maze.cell_id(6, 7)
+        self.assertEqual(maze.flood_to_cell(cell), 1)
+        flooded = [c for c in maze.cost if c != maze.MAX_COST]
+        self.assertLess(len(flooded), 16)
+
+
 class TestDirectionToSmallest(unittest.TestCase):
 
     def test_direction_to_smallest(self):
@@ -222,6 +433,269 @@ class TestDirectionToSmallest(unittest.TestCase):
         self.assertEqual(maze.direction_to_smallest(cell, DIR_WEST), DIR_NORTH)
 
 
+class TestMazeGradient(unittest.TestCase):
+
+    def check_gradient(self, maze, mask):
+        maze.set_mask(mask)
+        for cell in range(maze.size * maze.size):
+            for heading in range(DIR_COUNT):
+                self.assertEqual(maze.next_direction(cell, heading),
+                                 maze.direction_to_smallest(cell, heading))
+
+    def test_gradient_after_flood(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.set_gradient(True)
+        maze.flood_for_search()
+        self.check_gradient(maze, OPEN_MAZE_MASK)
+        maze.set_engine(FLOOD_BITBOARD)
+        maze.flood_for_search(0)
+        self.check_gradient(maze, OPEN_MAZE_MASK)
+
+    def test_gradient_after_repair(self):
+        import random
+        rng = random.Random(11)
+        maze = Maze()
+        maze.set_gradient(True)
+        maze.set_incremental(True)
+        for _ in range(100):
+            cell = rng.randrange(maze.size * maze.size)
+            state = rng.choice([WALL_PRESENT, WALL_ABSENT])
+            maze.update_wall(cell, rng.randrange(DIR_COUNT), state)
+            maze.flood_for_speed_run()
+            self.check_gradient(maze, CLOSED_MAZE_MASK)
+
+    def test_gradient_after_dual_flood(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.set_gradient(True)
+        maze.flood_dual()
+        self.check_gradient(maze, CLOSED_MAZE_MASK)
+
+    def test_gradient_after_early_stop(self):
+        maze = Maze()
+        maze.set_gradient(True)
+        # fill the table for a different target first
+        maze.flood_for_search(maze.cell_id(15, 0))
+        cell = maze.cell_id(3, 3)
+        self.assertEqual(maze.next_direction(cell), DIR_EAST)
+        self.assertFalse(maze.speed_run_possible())
+        self.check_gradient(maze, maze.mask)
+        maze.flood_for_search(maze.cell_id(15, 0))
+        maze.flood_to_cell(cell, maze.cell_id(3, 15), neighbours=True)
+        self.assertEqual(maze.next_direction(cell), DIR_NORTH)
+
+    def test_gradient_turned_on_after_flood(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.flood_for_search()
+        maze.set_gradient(True)
+        self.check_gradient(maze, OPEN_MAZE_MASK)
+
+    def test_direction_to_smallest_looks_back(self):
+        maze = Maze()
+        maze.init_walls()
+        cell = maze.cell_id(3, 3)
+        maze.set_goal(maze.cell_id(2, 3))
+        maze.update_wall(cell, DIR_EAST, WALL_PRESENT)
+        maze.flood()
+        self.assertEqual(maze.direction_to_smallest(cell, DIR_NORTH), DIR_WEST)
+        self.assertEqual(maze.direction_to_smallest(cell, DIR_EAST), DIR_WEST)
+
+
+class TestMazeFloodCache(unittest.TestCase):
+
+    def test_version_changes(self):
+        maze = Maze()
+        version = maze.version
+        maze.set_wall(maze.cell_id(3, 3), DIR_NORTH, WALL_PRESENT)
+        self.assertGreater(maze.version, version)
+        version = maze.version
+        maze.update_wall(maze.cell_id(3, 3), DIR_EAST, WALL_PRESENT)
+        self.assertGreater(maze.version, version)
+        version = maze.version
+        maze.update_wall(maze.cell_id(3, 3), DIR_EAST, WALL_ABSENT)
+        self.assertEqual(maze.version, version)
+        maze.set_goals([maze.cell_id(4, 4)])
+        self.assertGreater(maze.version, version)
+        version = maze.version
+        maze.init_walls()
+        self.assertGreater(maze.version, version)
+        version = maze.version
+        maze.flood()
+        self.assertEqual(maze.version, version)
+
+    def test_cache_returns_same_costs(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.set_mask(CLOSED_MAZE_MASK)
+        search = maze.flood_for_search()
+        search_cost = list(maze.cost)
+        speed = maze.flood_for_speed_run(0)
+        speed_cost = list(maze.cost)
+        self.assertEqual(len(maze.flood_cache), 2)
+        maze.cost[:] = maze.clear_cost
+        self.assertEqual(maze.flood_for_search(), search)
+        self.assertEqual(list(maze.cost), search_cost)
+        self.assertEqual(maze.flood_for_speed_run(0), speed)
+        self.assertEqual(list(maze.cost), speed_cost)
+        self.assertEqual(maze.mask, CLOSED_MAZE_MASK)
+
+    def test_cache_misses_after_wall_change(self):
+        maze = Maze()
+        self.assertEqual(maze.flood_for_search(), 14)
+        maze.update_wall(maze.cell_id(0, 1), DIR_NORTH, WALL_PRESENT)
+        maze.update_wall(maze.cell_id(0, 1), DIR_EAST, WALL_PRESENT)
+        self.assertEqual(maze.flood_for_search(), maze.MAX_COST)
+
+    def test_cache_hits_for_tuple_or_list(self):
+        maze = Maze()
+        maze.set_flood_log(4)
+        goals = (maze.cell_id(7, 7), maze.cell_id(8, 8))
+        maze.flood_for_search(goals)
+        maze.flood_for_search(goals)
+        maze.flood_for_search(list(goals))
+        self.assertEqual([entry[0] for entry in maze.flood_log.entries()], ['flood', 'cache', 'cache'])
+
+    def test_cache_not_fooled_by_goal_list(self):
+        maze = Maze()
+        self.assertEqual(maze.flood_for_search(), 14)
+        goals = maze.get_goals()
+        goals[:] = [maze.cell_id(0, 3)]
+        self.assertEqual(maze.flood_for_search(), 14)
+        maze.set_goals(goals)
+        self.assertEqual(maze.flood_for_search(), 3)
+
+    def test_cache_is_bounded(self):
+        maze = Maze()
+        for cell in range(10):
+            maze.flood_for_search(cell)
+        self.assertEqual(len(maze.flood_cache), FLOOD_CACHE_SIZE)
+        maze.set_cache_size(1)
+        self.assertEqual(len(maze.flood_cache), 1)
+        maze.set_cache_size(0)
+        maze.flood_for_search()
+        self.assertEqual(len(maze.flood_cache), 0)
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestMazeNumpyBatch(unittest.TestCase):
+
+    def test_batch_matches_flood(self):
+        import random
+        import maze_numpy
+        rng = random.Random(21)
+        mazes = []
+        for _ in range(20):
+            maze = Maze()
+            for _ in range(rng.randrange(400)):
+                cell = rng.randrange(maze.size * maze.size)
+                state = rng.choice([WALL_PRESENT, WALL_ABSENT])
+                maze.update_wall(cell, rng.randrange(DIR_COUNT), state)
+            mazes.append(maze)
+        loaded = Maze()
+        loaded.init_walls_from_string(all_japan_2007)
+        mazes.append(loaded)
+        for mask in (OPEN_MAZE_MASK, CLOSED_MAZE_MASK):
+            for target in (None, 0):
+                costs = maze_numpy.flood_mazes(mazes, target, mask)
+                for maze, cost in zip(mazes, costs):
+                    maze.set_mask(mask)
+                    maze.flood(target)
+                    self.assertEqual(list(cost), list(maze.cost))
+
+
+class TestSearchSimulator(unittest.TestCase):
+
+    def test_simulator_search_and_return(self):
+        from maze_sim import SearchSimulator, maze_from_lines
+        sim = SearchSimulator(maze_from_lines(all_japan_2007))
+        stats = sim.run()
+        self.assertTrue(stats['returned'])
+        self.assertEqual(sim.cell, 0)
+        self.assertIsNotNone(stats['goal_cells'])
+        self.assertEqual(stats['floods'], stats['cells'])
+        self.assertGreater(stats['wall_updates'], 0)
+        self.assertGreaterEqual(stats['run_length'], 71)
+
+    def test_simulator_strategies_agree(self):
+        from maze_sim import SearchSimulator, STRATEGIES, maze_from_lines
+        results = []
+        # the flood strategies go the same way, frontier explores elsewhere
+        for name in ('flood', 'incremental'):
+            sim = SearchSimulator(maze_from_lines(all_japan_2007), STRATEGIES[name]())
+            stats = sim.run()
+            del stats['flood_us']
+            results.append(stats)
+        for stats in results[1:]:
+            self.assertEqual(stats, results[0])
+
+    def test_simulator_finds_speed_run(self):
+        from maze_sim import SearchSimulator, maze_from_lines
+        sim = SearchSimulator(maze_from_lines(empty_classic_maze))
+        stats = sim.run()
+        self.assertEqual(stats['goal_cells'], 14)
+        self.assertIsNotNone(stats['solved_cells'])
+        self.assertEqual(stats['run_length'], 14)
+
+    def test_simulator_stops_when_goal_is_walled_off(self):
+        from maze_sim import SearchSimulator, STRATEGIES
+        truth = Maze()
+        for goal in truth.get_goals():
+            for direction in range(DIR_COUNT):
+                truth.set_wall(goal, direction, WALL_PRESENT)
+        for name in STRATEGIES:
+            sim = SearchSimulator(truth, STRATEGIES[name]())
+            stats = sim.run()
+            self.assertIsNone(stats['goal_cells'], name)
+            self.assertLess(stats['cells'], 10000, name)
+
+    def test_frontier_strategy_proves_speed_run(self):
+        from maze_sim import SearchSimulator, FrontierStrategy, maze_from_lines
+        sim = SearchSimulator(maze_from_lines(all_japan_2007), FrontierStrategy())
+        stats = sim.run()
+        self.assertTrue(stats['returned'])
+        self.assertIsNotNone(stats['solved_cells'])
+        self.assertEqual(stats['run_length'], 71)
+        self.assertEqual(sim.maze.frontier_cells(), [])
+        # the routes are only flooded for again when a wall might change them
+        self.assertLess(stats['floods'], stats['cells'] // 2)
+
+
+class TestTournament(unittest.TestCase):
+
+    def test_tournament_resumes(self):
+        import os
+        import tempfile
+        from maze_tournament import run_tournament, read_results
+        from maze_sim import STRATEGIES
+        mazes = {'empty': empty_classic_maze}
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ('results.jsonl', 'results.csv'):
+                output = os.path.join(folder, name)
+                self.assertEqual(run_tournament(output, ['flood'], mazes, 1), 1)
+                self.assertEqual(run_tournament(output, None, mazes, 2), len(STRATEGIES) - 1)
+                self.assertEqual(run_tournament(output, None, mazes, 2), 0)
+                results = read_results(output)
+                self.assertEqual(len(results), len(STRATEGIES))
+                self.assertEqual(int(results[0]['run_length']), 14)
+
+    def test_tournament_records_errors(self):
+        import os
+        import tempfile
+        from maze_tournament import run_tournament, read_results
+        mazes = {'empty': empty_classic_maze, 'broken': ['not a maze']}
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ('results.jsonl', 'results.csv'):
+                output = os.path.join(folder, name)
+                self.assertEqual(run_tournament(output, ['flood'], mazes, 2), 2)
+                results = {result['maze']: result for result in read_results(output)}
+                self.assertEqual(int(results['empty']['run_length']), 14)
+                self.assertIn('ValueError', results['broken']['error'])
+                # the failed job is tried again, the good one is not
+                self.assertEqual(run_tournament(output, ['flood'], mazes, 1), 1)
+
+
 class TestMazeSolution(unittest.TestCase):
     def test_maze_has_no_solution_after_init(self):
         maze = Maze()
@@ -234,6 +708,141 @@ class TestMazeSolution(unittest.TestCase):
         self.assertTrue(maze.speed_run_possible())
 
 
+class TestMazeDualFlood(unittest.TestCase):
+
+    def check_dual(self, maze):
+        search = maze.flood_for_search()
+        search_cost = list(maze.cost)
+        speed = maze.flood_for_speed_run()
+        speed_cost = list(maze.cost)
+        self.assertEqual(maze.flood_dual(), (search, speed))
+        self.assertEqual(list(maze.search_cost), search_cost)
+        self.assertEqual(list(maze.cost), speed_cost)
+        self.assertEqual(maze.speed_run_possible(), search == speed)
+
+    def test_dual_flood_empty_maze(self):
+        maze = Maze()
+        self.check_dual(maze)
+        self.assertEqual(maze.flood_dual(stop_early=True), (14, maze.MAX_COST))
+
+    def test_early_stop_marks_costs_unfinished(self):
+        maze = Maze()
+        self.assertFalse(maze.costs_complete())
+        maze.flood_for_search()
+        self.assertTrue(maze.costs_complete())
+        self.assertFalse(maze.speed_run_possible())
+        self.assertFalse(maze.costs_complete())
+        maze.flood_dual()
+        self.assertTrue(maze.costs_complete())
+        maze.flood_to_cell(0)
+        self.assertFalse(maze.costs_complete())
+
+    def test_dual_flood_loaded_maze(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        self.check_dual(maze)
+
+    def test_dual_flood_partly_explored(self):
+        import random
+        rng = random.Random(7)
+        maze = Maze()
+        for step in range(300):
+            cell = rng.randrange(maze.size * maze.size)
+            state = rng.choice([WALL_PRESENT, WALL_ABSENT])
+            maze.update_wall(cell, rng.randrange(DIR_COUNT), state)
+            if step % 30 == 0:
+                self.check_dual(maze)
+
+
+class TestMazePlanSpeedRun(unittest.TestCase):
+
+    def check_route(self, maze, route):
+        for here, there in zip(route, route[1:]):
+            exits = [d for d in range(DIR_COUNT)
+                     if maze.neighbour(here, d) == there and not
+                     maze.walls[here] >> d * 2 & CLOSED_MAZE_MASK]
+            self.assertEqual(len(exits), 1)
+
+    def count_turns(self, maze, route):
+        steps = [b - a for a, b in zip(route, route[1:])]
+        return sum(1 for a, b in zip(steps, steps[1:]) if a != b)
+
+    def test_plan_with_cell_counting_matches_flood(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        costs = RunCosts(cell=1, fastest=1, accel=0, turn=0, around=0)
+        time, route = maze.plan_speed_run(costs=costs)
+        self.assertEqual(time, maze.flood_for_speed_run())
+        self.assertEqual(route[0], 0)
+        self.assertIn(route[-1], maze.get_goals())
+        self.check_route(maze, route)
+
+    def test_plan_prefers_straights(self):
+        maze = Maze()
+        for cell in range(maze.size * maze.size):
+            for direction in range(DIR_COUNT):
+                maze.update_wall(cell, direction, WALL_ABSENT)
+        time, route = maze.plan_speed_run()
+        self.assertEqual(len(route) - 1, maze.flood_for_speed_run())
+        self.assertEqual(self.count_turns(maze, route), 1)
+        self.check_route(maze, route)
+
+    def test_plan_needs_known_route(self):
+        maze = Maze()
+        self.assertIsNone(maze.plan_speed_run())
+
+
+class TestMazeCompileRoute(unittest.TestCase):
+
+    def test_compile_route_empty_maze(self):
+        maze = Maze()
+        maze.flood()
+        self.assertEqual(maze.compile_route(), [7, MOVE_RIGHT, 7])
+        self.assertEqual(maze.compile_route(0, DIR_EAST),
+                         [MOVE_LEFT, 7, MOVE_RIGHT, 7])
+        self.assertEqual(maze.compile_route(0, DIR_SOUTH),
+                         [MOVE_AROUND, 7, MOVE_RIGHT, 7])
+
+    def test_compile_route_follows_costs(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.flood_for_speed_run()
+        route = maze.route_from_costs()
+        self.assertEqual(len(route) - 1, maze.cost[0])
+        self.assertIn(route[-1], maze.get_goals())
+        moves = maze.compile_route()
+        self.assertEqual(sum(m for m in moves if m > 0), maze.cost[0])
+
+    def test_compile_route_is_cached(self):
+        maze = Maze()
+        maze.flood()
+        moves = maze.compile_route()
+        self.assertIs(maze.compile_route(), moves)
+        maze.update_wall(maze.cell_id(0, 3), DIR_NORTH, WALL_PRESENT)
+        maze.flood()
+        self.assertIsNot(maze.compile_route(), moves)
+        self.assertEqual(maze.compile_route(), [3, MOVE_RIGHT, 7, MOVE_LEFT, 4])
+
+    def test_compile_route_target_changed_in_place(self):
+        maze = Maze()
+        targets = [maze.cell_id(0, 3)]
+        maze.flood(targets)
+        self.assertEqual(maze.compile_route(), [3])
+        targets[0] = maze.cell_id(0, 1)
+        maze.flood(targets)
+        self.assertEqual(maze.compile_route(), [1])
+
+    def test_moves_from_planned_route(self):
+        maze = Maze()
+        for cell in range(maze.size * maze.size):
+            for direction in range(DIR_COUNT):
+                maze.update_wall(cell, direction, WALL_ABSENT)
+        time, route = maze.plan_speed_run()
+        moves = maze.moves_from_route(route)
+        self.assertEqual(len(moves), 3)
+        self.assertEqual(sum(m for m in moves if m > 0), 14)
+
+
 class TestMazeLoad(unittest.TestCase):
 
     def test_maze_load(self):
@@ -252,6 +861,584 @@ class TestMazeLoad(unittest.TestCase):
         self.assertEqual(maze.cost[start_cell], 72)
 
 
+    def test_maze_load_goal_markers(self):
+        lines = [line.replace('G', ' ') for line in empty_classic_maze]
+        lines[1] = lines[1][:5] + 'G' + lines[1][6:]
+        maze = Maze()
+        maze.init_walls_from_string(lines)
+        self.assertEqual(maze.get_goals(), [maze.cell_id(1, 15)])
+        maze.init_walls_from_string(empty_classic_maze)
+        self.assertEqual(maze.get_goals(), maze.default_goals())
+
+    def test_maze_load_text_and_file(self):
+        import os
+        import tempfile
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        text = '\n'.join(all_japan_2007) + '\n'
+        copy = Maze()
+        copy.init_walls_from_string(text)
+        self.assertEqual(bytes(copy.walls), bytes(maze.walls))
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'japan2007.txt')
+            with open(path, 'w') as file:
+                file.write(text)
+            copy = Maze(8)
+            copy.init_walls_from_string(path)
+        self.assertEqual(bytes(copy.walls), bytes(maze.walls))
+
+    def test_maze_load_ragged_lines(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        # take the East wall off the top right cell and strip the spaces
+        lines = list(all_japan_2007)
+        lines[1] = lines[1][:-1].rstrip()
+        copy = Maze()
+        copy.init_walls_from_string(lines)
+        maze.set_wall(maze.cell_id(15, 15), DIR_EAST, WALL_ABSENT)
+        self.assertEqual(bytes(copy.walls), bytes(maze.walls))
+        lines[3] = lines[3] + '|'
+        with self.assertRaises(ValueError):
+            copy.init_walls_from_string(lines)
+        with self.assertRaises(ValueError):
+            copy.init_walls_from_string(all_japan_2007[:-1])
+
+    def test_maze_load_resets_goals(self):
+        lines = [line.replace('G', ' ') for line in empty_classic_maze]
+        lines[1] = lines[1][:5] + 'G' + lines[1][6:]
+        maze = Maze()
+        maze.init_walls_from_string(lines)
+        self.assertEqual(maze.get_goals(), [maze.cell_id(1, 15)])
+        maze.init_walls_from_string(all_japan_2007)
+        self.assertEqual(maze.get_goals(), maze.default_goals())
+
+    def test_maze_load_ignores_trailing_text(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        copy = Maze()
+        copy.init_walls_from_string(all_japan_2007 + ['', 'o---o', '|   |', 'o---o'])
+        self.assertEqual(bytes(copy.walls), bytes(maze.walls))
+        copy.init_walls_from_string(all_japan_2007 + ['All Japan 2007, a much longer comment line than the maze'])
+        self.assertEqual(bytes(copy.walls), bytes(maze.walls))
+
+    def test_maze_load_half_size(self):
+        maze = Maze(32)
+        maze.update_wall(maze.cell_id(3, 30), DIR_EAST, WALL_PRESENT)
+        lines = maze.get_maze_string().split('\n')
+        copy = Maze()
+        copy.init_walls_from_string(iter(lines))
+        self.assertEqual(copy.size, 32)
+        self.assertTrue(copy.cell_has_wall(copy.cell_id(4, 30), DIR_WEST))
+        self.assertEqual(copy.flood(0), maze.flood(0))
+
+    def test_maze_load_rectangular(self):
+        lines = ["o---o---o---o",
+                 "|   | G     |",
+                 "o   o   o---o",
+                 "|           |",
+                 "o---o---o---o"]
+        maze = Maze()
+        maze.init_walls_from_string(lines)
+        self.assertEqual((maze.width, maze.height, maze.size), (3, 2, 3))
+        self.assertEqual(maze.get_goals(), [maze.cell_id(1, 1)])
+        self.assertEqual(maze.flood(), 2)
+        self.assertEqual(list(maze.cost), [2, 3, 1, 0, 2, 1])
+        self.assertTrue(maze.cell_has_wall(maze.cell_id(2, 1), DIR_SOUTH))
+        rows = maze.get_maze_rows()
+        self.assertEqual(rows[:3], [lines[0], lines[1].replace('G', ' '), lines[2]])
+        self.assertEqual(rows[3], '| S         |')
+
+
+class TestMazeRectangular(unittest.TestCase):
+
+    def test_size_keyword(self):
+        maze = Maze(size=32)
+        self.assertEqual((maze.width, maze.height, maze.size), (32, 32, 32))
+        maze = Maze(size=8, height=4)
+        self.assertEqual((maze.width, maze.height), (8, 4))
+
+    def test_rectangular_cells(self):
+        maze = Maze(5, 3)
+        self.assertEqual((maze.width, maze.height, maze.size, maze.MAX_COST), (5, 3, 5, 15))
+        self.assertEqual(maze.cell_id(2, 1), 7)
+        self.assertEqual(maze.cell_xy(7), (2, 1))
+        self.assertEqual(maze.neighbour(7, DIR_EAST), 10)
+        self.assertEqual(maze.neighbour(7, DIR_WEST), 4)
+        self.assertEqual(maze.default_goals(), [7])
+        self.assertTrue(maze.cell_has_wall(maze.cell_id(4, 1), DIR_EAST))
+        self.assertTrue(maze.cell_has_wall(maze.cell_id(3, 2), DIR_NORTH))
+
+    def test_rectangular_flood(self):
+        maze = Maze(6, 3)
+        self.assertEqual(maze.default_goals(), [maze.cell_id(2, 1), maze.cell_id(3, 1)])
+        maze.set_wall(maze.cell_id(1, 1), DIR_EAST, WALL_PRESENT)
+        for engine in (FLOOD_QUEUE, FLOOD_BITBOARD):
+            maze.set_engine(engine)
+            self.assertEqual(maze.flood(maze.cell_id(5, 2)), 7)
+            self.assertEqual(maze.cost[maze.cell_id(0, 2)], 5)
+
+    def test_large_maze(self):
+        maze = Maze(256)
+        self.assertEqual(maze.cost.typecode, 'I')
+        maze.set_cache_size(0)
+        self.assertEqual(maze.flood(maze.cell_id(255, 255)), 510)
+
+
+class TestMazeGenerator(unittest.TestCase):
+
+    def exits(self, maze):
+        return sum(1 for cell in range(maze.MAX_COST) for direction in (DIR_NORTH, DIR_EAST)
+                   if maze.walls[cell] >> direction * 2 & WALL_MASK == WALL_ABSENT)
+
+    def test_generators_reach_every_cell(self):
+        import maze_gen
+        for width, height in ((16, 16), (5, 9)):
+            for name, generator in maze_gen.GENERATORS.items():
+                maze = Maze(width, height)
+                generator(maze, 3)
+                self.assertEqual(maze.walls[0] & ALL_UNKNOWN, 0)
+                maze.set_mask(CLOSED_MAZE_MASK)
+                maze.flood(0)
+                self.assertLess(max(maze.cost), maze.MAX_COST, name)
+                if name in ('perfect', 'binary_tree', 'sidewinder', 'corridor'):
+                    self.assertEqual(self.exits(maze), width * height - 1, name)
+
+    def test_generators_are_repeatable(self):
+        import maze_gen
+        for generator in maze_gen.GENERATORS.values():
+            maze = Maze()
+            copy = Maze()
+            generator(maze, 42)
+            generator(copy, 42)
+            self.assertEqual(bytes(maze.walls), bytes(copy.walls))
+        maze_gen.perfect(copy, 43)
+        self.assertNotEqual(bytes(maze.walls), bytes(copy.walls))
+
+    def test_competition_maze(self):
+        import maze_gen
+        maze = Maze()
+        maze_gen.competition(maze, 1)
+        goals = maze.get_goals()
+        self.assertEqual(goals, maze.default_goals())
+        self.assertEqual([maze.cell_has_exit(0, direction) for direction in range(DIR_COUNT)],
+                         [True, False, False, False])
+        entrances = [(cell, direction) for cell in goals for direction in range(DIR_COUNT)
+                     if maze.cell_has_exit(cell, direction) and maze.neighbour(cell, direction) not in goals]
+        self.assertEqual(len(entrances), 1)
+        self.assertGreater(self.exits(maze), maze.MAX_COST)
+
+    def test_corridor_is_longest(self):
+        import maze_gen
+        layouts = set()
+        for seed in range(10):
+            maze = Maze(8, 5)
+            maze_gen.corridor(maze, seed)
+            self.assertEqual(maze.flood(0), 0)
+            self.assertEqual(max(maze.cost), 39)
+            layouts.add(bytes(maze.walls))
+        # up and down the columns or along the rows
+        self.assertEqual(len(layouts), 2)
+
+
+class TestFloodLog(unittest.TestCase):
+
+    def test_log_is_off_by_default(self):
+        maze = Maze()
+        maze.flood()
+        self.assertIsNone(maze.flood_log)
+
+    def test_log_counts_flood(self):
+        maze = Maze()
+        maze.init_walls_from_string(empty_classic_maze)
+        maze.set_flood_log(8)
+        maze.flood(0)
+        kind, dequeued, peak, edges, us, mask, target = maze.flood_log.entries()[0]
+        self.assertEqual((kind, dequeued, mask, target), ('flood', 256, OPEN_MAZE_MASK, 0))
+        # every inside wall is open except the one East of the start
+        self.assertEqual(edges, 2 * 2 * 16 * 15 - 2)
+        self.assertEqual(peak, 17)
+        self.assertGreaterEqual(us, 0)
+
+    def test_log_kinds_and_ring(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.set_flood_log(3)
+        maze.flood_for_search()
+        maze.flood_for_search()
+        maze.set_incremental(True)
+        maze.set_wall(40, DIR_NORTH, WALL_PRESENT)
+        maze.flood_for_search()
+        maze.set_engine(FLOOD_BITBOARD)
+        maze.flood_for_speed_run()
+        self.assertEqual(len(maze.flood_log), 3)
+        self.assertEqual(maze.flood_log.count, 4)
+        entries = maze.flood_log.entries()
+        self.assertEqual([entry[0] for entry in entries], ['cache', 'repair', 'bitboard'])
+        self.assertEqual(entries[-1][5], CLOSED_MAZE_MASK)
+        lines = []
+        maze.flood_log.dump(lines.append)
+        self.assertEqual(lines[0], 'kind,dequeued,peak,edges,us,mask,target')
+        self.assertTrue(lines[1].startswith('cache,0,0,0,'))
+        maze.flood_log.clear()
+        self.assertEqual(maze.flood_log.entries(), [])
+
+
+class TestSlicedFlood(unittest.TestCase):
+
+    def test_sliced_flood_matches_flood(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.flood()
+        expected = list(maze.cost)
+        maze.flood_start()
+        steps = 1
+        while not maze.flood_step(16):
+            self.assertFalse(maze.flood_complete())
+            steps += 1
+        self.assertTrue(maze.flood_complete())
+        # every cell is reached so it takes 256 / 16 steps
+        self.assertEqual(steps, 16)
+        self.assertEqual(list(maze.cost), expected)
+
+    def test_old_costs_kept_until_complete(self):
+        maze = Maze()
+        maze.init_walls_from_string(empty_classic_maze)
+        maze.flood(0)
+        maze.flood_start()
+        maze.flood_step(8)
+        self.assertEqual(maze.cost[0], 0)
+
+    def test_restart_when_walls_change(self):
+        maze = Maze()
+        maze.init_walls_from_string(empty_classic_maze)
+        maze.flood_start(0)
+        maze.flood_step(4)
+        maze.set_wall(1, DIR_EAST, WALL_PRESENT)
+        while not maze.flood_step(4):
+            pass
+        sliced = list(maze.cost)
+        maze.flood(0)
+        self.assertEqual(sliced, list(maze.cost))
+        # a change after the flood is complete makes it stale
+        maze.set_wall(2, DIR_EAST, WALL_PRESENT)
+        self.assertFalse(maze.flood_complete())
+        while not maze.flood_step(64):
+            pass
+        sliced = list(maze.cost)
+        maze.flood(0)
+        self.assertEqual(sliced, list(maze.cost))
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_benchmark_runs_every_engine(self):
+        import maze_bench
+        lines = []
+        results = maze_bench.run_benchmarks(sizes=(8,), repeat=3, report=lines.append)
+        self.assertEqual(len(results), len(maze_bench.ENGINES) * 6)
+        self.assertEqual(len(lines), len(results) + 1)
+        result = results['queue/all_japan_2007']
+        self.assertEqual(result['cells'], 256)
+        self.assertLessEqual(result['median_us'], result['p95_us'])
+        self.assertEqual(results['queue/corridor_8']['cells'], 64)
+
+    def test_benchmark_baseline(self):
+        import os
+        import tempfile
+        import maze_bench
+        results = {'queue/test': {'median_us': 100}, 'bitboard/test': {'median_us': 50}}
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'baseline.json')
+            maze_bench.save_baseline(path, results)
+            self.assertEqual(maze_bench.regressions(path, results), [])
+            results['queue/test']['median_us'] = 130
+            self.assertEqual(maze_bench.regressions(path, results), [('queue/test', 100, 130)])
+            self.assertEqual(maze_bench.regressions(path, results, 0.5), [])
+
+
+class TestMazeString(unittest.TestCase):
+
+    def test_maze_string_round_trip(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        lines = maze.get_maze_string().split('\n')
+        self.assertEqual(lines[-2], all_japan_2007[-1].replace('o', '+', 1))
+        self.assertEqual(lines[-3], '| S |' + all_japan_2007[-2][5:])
+        copy = Maze()
+        copy.init_walls_from_string(lines)
+        self.assertEqual(bytes(copy.walls), bytes(maze.walls))
+
+    def test_maze_string_views(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.set_mask(CLOSED_MAZE_MASK)
+        maze.flood()
+        rows = maze.get_maze_rows(VIEW_COSTS)
+        self.assertEqual(maze.mask, CLOSED_MAZE_MASK)
+        self.assertEqual(rows[-2][:8], '| 71| 70')
+        rows = maze.get_maze_rows(VIEW_DIRS)
+        self.assertEqual(rows[-2][:8], '| ^ | ^ ')
+        maze = Maze()
+        maze.update_wall(0, DIR_NORTH, WALL_ABSENT)
+        rows = maze.get_maze_rows(VIEW_VISITED)
+        self.assertEqual(rows[-2][:8], '| * |   ')
+
+    def test_live_view(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        maze.flood()
+        live = LiveView(maze)
+        self.assertEqual(live.frame().count('\x1b['), 33)
+        self.assertEqual(live.frame(), '')
+        maze.set_wall(0, DIR_NORTH, WALL_PRESENT)
+        maze.flood()
+        self.assertEqual(live.frame(), '\x1b[31;2H---\x1b[32;2H256')
+
+    def test_live_view_half_size(self):
+        maze = Maze(32)
+        maze.flood(0)
+        live = LiveView(maze)
+        live.frame()
+        # wall off the start so that no other cell can be reached
+        maze.set_wall(0, DIR_NORTH, WALL_PRESENT)
+        maze.set_wall(0, DIR_EAST, WALL_PRESENT)
+        maze.flood(0)
+        self.assertNotEqual(live.frame(), '')
+        widths = set(len(row) for row in maze.get_maze_rows(VIEW_COSTS))
+        self.assertEqual(widths, set([32 * 4 + 1]))
+        self.assertEqual(maze.get_maze_rows(VIEW_COSTS)[-2][:8], '|  0|---')
+
+    def test_large_costs(self):
+        maze = Maze(512)
+        maze.cost[1] = 1234
+        maze.cost[2] = 56789
+        maze.cost[3] = 123456
+        maze.cost[4] = maze.MAX_COST
+        text = maze.cell_text(VIEW_COSTS)
+        self.assertEqual(text[1:5], [' 1k', '56k', '***', '---'])
+
+
+class TestMazeBinary(unittest.TestCase):
+
+    def test_maz_round_trip(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        data = maze.get_maz()
+        self.assertEqual(len(data), 256)
+        self.assertEqual(data[0], 0x0e)  # start cell has walls E, S and W
+        copy = Maze()
+        copy.flood()
+        copy.init_walls_from_maz(data)
+        self.assertEqual(bytes(copy.walls), bytes(maze.walls))
+        self.assertEqual(copy.flood(), maze.flood())
+
+    def test_maz_changes_size(self):
+        maze = Maze()
+        maze.init_walls_from_maz(bytes([15]) * 64)
+        self.assertEqual(maze.size, 8)
+        self.assertEqual(maze.get_goals(), maze.default_goals())
+        self.assertTrue(maze.cell_has_wall(9, DIR_WEST))
+
+    def test_packed_keeps_unknown(self):
+        maze = Maze()
+        maze.update_wall(20, DIR_NORTH, WALL_PRESENT)
+        copy = Maze(8)
+        copy.init_walls_from_packed(maze.get_packed())
+        self.assertEqual(copy.size, 16)
+        self.assertEqual(bytes(copy.walls), bytes(maze.walls))
+        self.assertEqual(copy.walls[40] >> DIR_EAST * 2 & WALL_MASK, WALL_UNKNOWN)
+
+    def test_corpus(self):
+        import os
+        import tempfile
+        from maze_corpus import write_corpus, MazeCorpus
+        mazes = []
+        for lines in (all_japan_2007, empty_classic_maze):
+            maze = Maze()
+            maze.init_walls_from_string(lines)
+            mazes.append(maze)
+        mazes[1].set_wall(20, DIR_NORTH, WALL_PRESENT)
+        with tempfile.TemporaryDirectory() as folder:
+            for packed in (False, True):
+                path = os.path.join(folder, 'mazes.mzc')
+                write_corpus(path, mazes, packed)
+                with MazeCorpus(path) as corpus:
+                    self.assertEqual(len(corpus), 2)
+                    maze = corpus.load(1)
+                    self.assertTrue(maze.cell_has_wall(20, DIR_NORTH))
+                    self.assertEqual(corpus.load(0, maze).flood(), mazes[0].flood())
+
+
+
+class TestShortestPath(unittest.TestCase):
+
+    def test_path_matches_flood(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        goal = maze.cell_id(7, 7)
+        for mask in (OPEN_MAZE_MASK, CLOSED_MAZE_MASK):
+            maze.set_mask(mask)
+            maze.flood(goal)
+            for cell in (0, 17, 100, 255):
+                distance, path = maze.shortest_path(cell, goal)
+                self.assertEqual(distance, maze.cost[cell])
+                self.assertEqual(len(path), distance + 1)
+                self.assertEqual((path[0], path[-1]), (cell, goal))
+
+    def test_same_cell(self):
+        maze = Maze()
+        self.assertEqual(maze.shortest_path(5, 5), (0, [5]))
+
+    def test_mask_and_virtual_walls(self):
+        maze = Maze()
+        self.assertEqual(maze.shortest_path(0, 2), (2, [0, 1, 2]))
+        maze.set_wall(1, DIR_NORTH, WALL_VIRTUAL)
+        self.assertEqual(maze.shortest_path(0, 2)[0], 4)
+        # the closed maze has no routes through unknown walls
+        maze.set_mask(CLOSED_MAZE_MASK)
+        self.assertEqual(maze.shortest_path(0, 2), (maze.MAX_COST, []))
+
+
+class TestExploration(unittest.TestCase):
+
+    def test_frontier_cells_on_shortest_routes(self):
+        maze = Maze()
+        cells = maze.frontier_cells()
+        # in an unknown maze the routes fill the rectangle from start to goal
+        # but the walls of the start cell are already known
+        self.assertNotIn(0, cells)
+        self.assertIn(1, cells)
+        self.assertIn(maze.cell_id(7, 7), cells)
+        self.assertIn(maze.cell_id(3, 4), cells)
+        self.assertNotIn(maze.cell_id(9, 9), cells)
+        maze.update_walls([(1, DIR_EAST, WALL_ABSENT), (1, DIR_NORTH, WALL_ABSENT), (1, DIR_WEST, WALL_PRESENT)])
+        self.assertNotIn(1, maze.frontier_cells())
+
+    def test_frontier_leaves_costs_alone(self):
+        maze = Maze()
+        maze.flood_for_search()
+        cost = list(maze.cost)
+        search_cost = list(maze.search_cost)
+        maze.frontier_cells()
+        self.assertEqual(list(maze.cost), cost)
+        self.assertEqual(list(maze.search_cost), search_cost)
+        self.assertTrue(maze.costs_complete())
+
+    def test_frontier_floods_only_when_routes_change(self):
+        maze = Maze()
+        maze.frontier_cells()
+        self.assertEqual(maze.explore_floods, 2)
+        # a wall away from the routes from the start to the goal
+        maze.update_wall(maze.cell_id(12, 2), DIR_EAST, WALL_PRESENT)
+        maze.frontier_cells()
+        self.assertEqual(maze.explore_floods, 2)
+        # walls found to be absent cannot change the open maze
+        maze.update_walls([(1, DIR_EAST, WALL_ABSENT), (1, DIR_NORTH, WALL_ABSENT), (1, DIR_WEST, WALL_PRESENT)])
+        self.assertNotIn(1, maze.frontier_cells())
+        self.assertEqual(maze.explore_floods, 2)
+        # a wall across the routes
+        maze.update_wall(2, DIR_NORTH, WALL_PRESENT)
+        maze.frontier_cells()
+        self.assertEqual(maze.explore_floods, 4)
+        # a different target
+        maze.frontier_cells([maze.cell_id(5, 5)])
+        self.assertEqual(maze.explore_floods, 6)
+
+    def test_frontier_floods_again_when_a_wall_goes(self):
+        maze = Maze()
+        maze.set_wall(maze.cell_id(0, 3), DIR_NORTH, WALL_PRESENT)
+        before = maze.frontier_cells()
+        maze.set_wall(maze.cell_id(0, 3), DIR_NORTH, WALL_UNKNOWN)
+        self.assertEqual(maze.frontier_cells(), Maze().frontier_cells())
+        self.assertNotEqual(maze.frontier_cells(), before)
+        self.assertEqual(maze.explore_floods, 4)
+
+    def test_exploration_route_is_to_nearest(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        self.assertEqual(maze.frontier_cells(), [])
+        self.assertEqual(maze.exploration_route(0), [])
+        maze = Maze()
+        self.assertEqual(maze.exploration_route(0), [0, 1])
+
+    def test_path_to_nearest(self):
+        maze = Maze()
+        maze.init_walls_from_string(all_japan_2007)
+        goals = maze.get_goals()
+        maze.set_mask(CLOSED_MAZE_MASK)
+        path = maze.path_to_nearest(0, goals)
+        self.assertEqual(len(path) - 1, maze.flood_for_speed_run())
+        self.assertIn(path[-1], goals)
+        self.assertEqual(maze.path_to_nearest(5, [5]), [5])
+        self.assertEqual(maze.path_to_nearest(0, []), [])
+        # straight ahead wins a tie
+        maze = Maze()
+        maze.update_wall(17, DIR_NORTH, WALL_ABSENT)
+        self.assertEqual(maze.path_to_nearest(17, [34, 19], DIR_EAST), [17, 33, 34])
+        self.assertEqual(maze.path_to_nearest(17, [34, 19], DIR_NORTH), [17, 18, 19])
+
+
+class TestMazePipeline(unittest.TestCase):
+
+    def walls_seen(self, truth, cells):
+        """
+        The walls of each cell in the truth maze as wall events
+        """
+        events = []
+        for cell in cells:
+            for direction in range(DIR_COUNT):
+                events.append((cell, direction, truth.walls[cell] >> direction * 2 & WALL_MASK))
+        return events
+
+    def test_burst_is_one_flood(self):
+        import asyncio
+        from maze_async import MazePipeline
+        truth = Maze()
+        truth.init_walls_from_string(all_japan_2007)
+        maze = Maze()
+        pipeline = MazePipeline(maze, interval_ms=5)
+
+        async def source():
+            for event in self.walls_seen(truth, range(8)):
+                yield event
+
+        async def main():
+            task = asyncio.create_task(pipeline.run())
+            await pipeline.ingest(source())
+            await asyncio.sleep(0.05)
+            pipeline.stop()
+            await task
+
+        asyncio.run(main())
+        self.assertEqual(pipeline.events, 32)
+        self.assertEqual(pipeline.floods, 1)
+        self.assertFalse(pipeline.stale())
+        expected = Maze()
+        expected.update_walls(self.walls_seen(truth, range(8)))
+        expected.flood_for_search()
+        self.assertEqual(list(maze.cost), list(expected.cost))
+
+    def test_next_direction_floods_when_stale(self):
+        import asyncio
+        from maze_async import MazePipeline
+        maze = Maze()
+        pipeline = MazePipeline(maze, interval_ms=1000)
+
+        async def main():
+            first = await pipeline.next_direction(17)
+            again = await pipeline.next_direction(17)
+            pipeline.add(17, DIR_NORTH, WALL_PRESENT)
+            blocked = await pipeline.next_direction(17)
+            return first, again, blocked
+
+        first, again, blocked = asyncio.run(main())
+        self.assertEqual((first, again, blocked), (DIR_NORTH, DIR_NORTH, DIR_EAST))
+        self.assertEqual(pipeline.floods, 2)
+        # a wall that is already known does not cause a flood
+        pipeline.add(17, DIR_NORTH, WALL_ABSENT)
+        self.assertFalse(pipeline.refresh())
+
+
 if __name__ == "__main__":
     print("This system is running {}".format(sys.implementation.name))
     print("start...")
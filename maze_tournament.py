@@ -0,0 +1,151 @@
+# maze_tournament.py
+# Maze code for MicroPython
+# Copyright (c) 2024 Peter Harrison
+# Contributions from Paul Busby and David Hannaford
+# Released under the MIT License (https://opensource.org/licenses/MIT)
+
+"""
+ Run every search strategy on every maze in a collection and record the results.
+
+ Each (strategy, maze) pair is a separate job for the simulator in maze_sim.py.
+ The jobs are shared out over a pool of processes, one per core by default, and
+ each result is written to the output file as soon as it arrives. The output is
+ a CSV file if its name ends in .csv and JSON lines otherwise.
+
+ If a job fails, its row has the error in the error column and the sweep
+ carries on with the rest. If the output file already has some results in it,
+ those jobs are skipped so an interrupted sweep can just be started again.
+ Jobs that failed are run again.
+
+ This is for the desktop only. Run it from the command line, for example
+
+   python maze_tournament.py --output results.jsonl --workers 8
+"""
+
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import maze_files
+from maze_sim import SearchSimulator, STRATEGIES, maze_from_lines
+
+# the columns in the output, in order
+FIELDS = ['strategy', 'maze', 'cells', 'floods', 'wall_updates', 'flood_us',
+          'goal_cells', 'solved_cells', 'returned', 'run_length', 'error']
+
+
+def maze_corpus():
+    """
+    All the mazes in maze_files.py as a dictionary of name: lines
+    """
+    return {name: lines for name, lines in vars(maze_files).items()
+            if not name.startswith('_') and isinstance(lines, list)}
+
+
+def run_job(strategy_name, maze_name, lines):
+    """
+    Run one strategy on one maze and return the result as a dictionary.
+    This runs in a worker process.
+    """
+    sim = SearchSimulator(maze_from_lines(lines), STRATEGIES[strategy_name]())
+    result = {'strategy': strategy_name, 'maze': maze_name}
+    result.update(sim.run())
+    return result
+
+
+def read_results(path):
+    """
+    Read the results already in the output file, if there is one
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as file:
+        if path.endswith('.csv'):
+            return list(csv.DictReader(file))
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class ResultWriter:
+    """
+    Append results to a CSV or JSON lines file, one at a time, flushing
+    after each so that nothing is lost if the sweep is stopped
+    """
+
+    def __init__(self, path):
+        self.is_csv = path.endswith('.csv')
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='')
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+            if new_file:
+                self.writer.writeheader()
+
+    def write(self, result):
+        if self.is_csv:
+            self.writer.writerow({field: result.get(field) for field in FIELDS})
+        else:
+            self.file.write(json.dumps(result) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run_tournament(output, strategies=None, mazes=None, workers=None):
+    """
+    Run every strategy on every maze, writing the results to the output file.
+
+    strategies is a list of names from maze_sim.STRATEGIES and mazes is a
+    dictionary of name: lines. By default, all of them are used. Jobs that
+    already have a result in the output file are skipped. workers is the
+    number of processes, one for each core if left out.
+    A job that raises an exception is written with just the strategy, the
+    maze and the error so that one bad maze does not stop the sweep.
+    Returns the number of new results, including any errors.
+    """
+    if strategies is None:
+        strategies = list(STRATEGIES)
+    if mazes is None:
+        mazes = maze_corpus()
+    done = {(result['strategy'], result['maze']) for result in read_results(output)
+            if not result.get('error')}
+    jobs = [(strategy, name) for strategy in strategies for name in mazes
+            if (strategy, name) not in done]
+    if not jobs:
+        return 0
+
+    writer = ResultWriter(output)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_job, strategy, name, mazes[name]): (strategy, name)
+                       for strategy, name in jobs}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as error:
+                    strategy, name = futures[future]
+                    result = {'strategy': strategy, 'maze': name, 'error': repr(error)}
+                writer.write(result)
+    finally:
+        writer.close()
+    return len(jobs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run search strategies over a set of mazes")
+    parser.add_argument('--output', default='tournament.jsonl',
+                        help="results file, CSV if it ends in .csv, JSON lines otherwise")
+    parser.add_argument('--strategies', nargs='*', choices=list(STRATEGIES),
+                        help="strategies to run, all of them by default")
+    parser.add_argument('--mazes', nargs='*', help="names of mazes from maze_files.py, all of them by default")
+    parser.add_argument('--workers', type=int, default=None, help="number of processes, one per core by default")
+    args = parser.parse_args()
+
+    corpus = maze_corpus()
+    if args.mazes:
+        corpus = {name: corpus[name] for name in args.mazes}
+    count = run_tournament(args.output, args.strategies, corpus, args.workers)
+    print(f"{count} new results written to {args.output}")